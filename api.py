@@ -0,0 +1,148 @@
+"""Minimal ASGI endpoint over the headless engine, for running MoodFlow as stateless workers.
+
+    OPENAI_KEY=... QLOO_KEY=... uvicorn api:app --workers 4
+
+POST /recommend  {"mood": "...", "time_context": "Evening", "preferences": ["Movies"], "additional_context": ""}
+GET  /healthz
+GET  /readyz     503 until the Qloo cache warm-up (MOODFLOW_WARMUP=1) has finished its first pass
+GET  /metrics    Prometheus text format
+GET  /img        ?u=<image url>&s=<signature>: card-sized, long-cached thumbnails (see thumbnails.py)
+"""
+import asyncio
+import json
+import logging
+
+import metrics
+import thumbnails
+from domains import PREFERENCE_OPTIONS
+from engine import MoodFlowEngine
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+
+_engine = None
+
+
+def get_engine():
+    """The worker's engine, built on first use so importing this module has no side effects"""
+    global _engine
+    if _engine is None:
+        _engine = MoodFlowEngine.from_env()
+    return _engine
+
+
+async def _send(send, status, body, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload):
+    await _send(send, status, json.dumps(payload).encode("utf-8"), b"application/json")
+
+
+class PayloadTooLarge(Exception):
+    """The request body is over MAX_BODY_BYTES"""
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise PayloadTooLarge(f"request body is over {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def _parse_request(body):
+    """Validate a /recommend body; raises ValueError with a client-facing message"""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("body must be JSON")
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+
+    mood = payload.get("mood")
+    if not isinstance(mood, str) or not mood.strip():
+        raise ValueError("'mood' must be a non-empty string")
+    preferences = payload.get("preferences") or []
+    if not isinstance(preferences, list) or any(p not in PREFERENCE_OPTIONS for p in preferences):
+        raise ValueError(f"'preferences' must be a list drawn from {PREFERENCE_OPTIONS}")
+    time_context = payload.get("time_context") or ""
+    additional_context = payload.get("additional_context") or ""
+    if not isinstance(time_context, str) or not isinstance(additional_context, str):
+        raise ValueError("'time_context' and 'additional_context' must be strings")
+    return mood.strip(), time_context, preferences, additional_context
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                get_engine()
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if _engine is not None:
+                _engine.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    route = (scope["method"], scope["path"].rstrip("/") or "/")
+    if route == ("GET", "/healthz"):
+        await _send_json(send, 200, {"status": "ok"})
+    elif route == ("GET", "/readyz"):
+        warmer = get_engine().warmer
+        progress = warmer.progress() if warmer is not None else {"ready": True}
+        await _send_json(send, 200 if progress["ready"] else 503, progress)
+    elif route == ("GET", "/metrics"):
+        await _send(send, 200, metrics.REGISTRY.render_prometheus().encode("utf-8"), b"text/plain; version=0.0.4; charset=utf-8")
+    elif route == ("GET", "/img"):
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1")
+        # Disk and upstream I/O; keep it off the event loop
+        status, content_type, headers, body = await asyncio.to_thread(
+            thumbnails.handle, scope["query_string"].decode("latin-1"), if_none_match
+        )
+        headers = [(name.lower().encode(), value.encode()) for name, value in headers]
+        await _send(send, status, body, content_type.encode(), headers)
+    elif route == ("POST", "/recommend"):
+        try:
+            mood, time_context, preferences, additional_context = _parse_request(await _read_body(receive))
+        except PayloadTooLarge as e:
+            await _send_json(send, 413, {"error": str(e)})
+            return
+        except ValueError as e:
+            await _send_json(send, 400, {"error": str(e)})
+            return
+        try:
+            result = await get_engine().recommend(mood, time_context, preferences, additional_context)
+        except Exception:
+            logger.exception("Recommendation failed")
+            await _send_json(send, 500, {"error": "recommendation failed"})
+            return
+        await _send_json(send, 200, result.to_dict())
+    elif scope["path"].rstrip("/") in ("/healthz", "/readyz", "/metrics", "/img", "/recommend"):
+        await _send_json(send, 405, {"error": "method not allowed"})
+    else:
+        await _send_json(send, 404, {"error": "not found"})
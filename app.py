@@ -1,10 +1,14 @@
 import streamlit as st
-import requests
-from openai import OpenAI
-import time
-import json
-from datetime import datetime
 import os
+import time
+
+import metrics
+import thumbnails
+from domains import DOMAINS_BY_KEY, PREFERENCE_OPTIONS, domains_for_preferences
+from engine import MoodFlowEngine, PipelineListener
+from rerank import analysis_tags, page
+from tag_index import tag_label
+from ui import APP_CSS, FOOTER_HTML, HEADER_HTML, render_domain_recommendations, summary_html
 
 # Page configuration
 st.set_page_config(
@@ -15,312 +19,154 @@ st.set_page_config(
 )
 
 # Custom CSS for beautiful styling
-st.markdown("""
-<style>
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 10px;
-        color: white;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    
-    .mood-card {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: white;
-        margin: 1rem 0;
-    }
-    
-    .recommendation-card {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 10px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin: 1rem 0;
-        border-left: 4px solid #667eea;
-    }
-    
-    .category-header {
-        background: linear-gradient(90deg, #4facfe 0%, #00f2fe 100%);
-        color: white;
-        padding: 0.8rem;
-        border-radius: 8px;
-        font-weight: bold;
-        margin: 1rem 0 0.5rem 0;
-    }
-    
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        border-radius: 25px;
-        padding: 0.5rem 2rem;
-        font-weight: bold;
-        transition: all 0.3s ease;
-    }
-    
-    .mood-emoji {
-        font-size: 2rem;
-        margin-right: 0.5rem;
-    }
-    
-    .analysis-box {
-        background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: #333;
-        margin: 1rem 0;
-    }
-    
-    .dynamic-mapping-box {
-        background: linear-gradient(135deg, #ffeaa7 0%, #fab1a0 100%);
-        padding: 1.5rem;
-        border-radius: 15px;
-        color: #333;
-        margin: 1rem 0;
-        border: 2px solid #e17055;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # Initialize session state
-if 'recommendations' not in st.session_state:
-    st.session_state.recommendations = {}
 if 'current_mood' not in st.session_state:
     st.session_state.current_mood = ""
-if 'mood_analysis' not in st.session_state:
-    st.session_state.mood_analysis = {}
-if 'ai_summary' not in st.session_state:
-    st.session_state.ai_summary = ""
-if 'dynamic_tags' not in st.session_state:
-    st.session_state.dynamic_tags = {}
+# References into the engine's result store (see result_store.py); the results themselves are shared
+if 'result_refs' not in st.session_state:
+    st.session_state.result_refs = None
+# How far "more like this" has paged through each domain's candidates
+if 'result_offsets' not in st.session_state:
+    st.session_state.result_offsets = {}
+# The last run's LLM summary while it streams in: {"stream", "text" so far, "since"}; the template shows until text arrives
+if 'pending_summary' not in st.session_state:
+    st.session_state.pending_summary = None
 
 
-QLOO_API_KEY = st.secrets["QLOO_KEY"]
-QLOO_BASE_URL = "https://hackathon.api.qloo.com/v2/insights"
+@st.cache_resource
+def load_api_keys():
+    """Read and check the API keys once per process instead of on every rerun"""
+    names = ("QLOO_KEY", "OPENAI_KEY")
+    try:
+        keys = {name: st.secrets.get(name) for name in names}
+    except FileNotFoundError:
+        keys = {}
+    missing = [name for name in names if not keys.get(name)]
+    if missing:
+        raise RuntimeError(f"Missing secrets: {', '.join(missing)}. Add them to .streamlit/secrets.toml.")
+    return keys["QLOO_KEY"], keys["OPENAI_KEY"]
 
-OPENAI_API_KEY = st.secrets["OPENAI_KEY"]
+try:
+    QLOO_API_KEY, OPENAI_API_KEY = load_api_keys()
+except RuntimeError as e:
+    st.error(str(e))
+    st.stop()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Show per-stage pipeline timings under the results
+SHOW_TIMINGS = os.environ.get("MOODFLOW_SHOW_TIMINGS", "0") == "1"
+# How often the summary panel picks up newly streamed summary text
+SUMMARY_POLL_SECONDS = 0.5
+# How long the panel waits for the LLM summary before settling for the template
+SUMMARY_DEADLINE_SECONDS = float(os.environ.get("MOODFLOW_SUMMARY_DEADLINE", "45"))
 
-def get_available_qloo_tags():
-    """Get a comprehensive list of available Qloo tags for dynamic mapping"""
-    # This is a more comprehensive list of available Qloo tags
+@st.cache_resource
+def get_engine(openai_api_key, qloo_api_key):
+    """One engine per process: its pooled clients and caches are shared by every session and rerun"""
+    return MoodFlowEngine(openai_api_key, qloo_api_key)
 
-    return {
-        "movie_genres": [
-            "urn:tag:genre:media:action", "urn:tag:genre:media:adventure", "urn:tag:genre:media:animation",
-            "urn:tag:genre:media:biography", "urn:tag:genre:media:comedy", "urn:tag:genre:media:crime",
-            "urn:tag:genre:media:documentary", "urn:tag:genre:media:drama", "urn:tag:genre:media:family",
-            "urn:tag:genre:media:fantasy", "urn:tag:genre:media:film-noir", "urn:tag:genre:media:history",
-            "urn:tag:genre:media:horror", "urn:tag:genre:media:music", "urn:tag:genre:media:musical",
-            "urn:tag:genre:media:mystery", "urn:tag:genre:media:romance", "urn:tag:genre:media:sci-fi",
-            "urn:tag:genre:media:sport", "urn:tag:genre:media:thriller", "urn:tag:genre:media:war",
-            "urn:tag:genre:media:western", "urn:tag:genre:media:indie", "urn:tag:genre:media:cult"
-        ],
-        "music_genres": [
-            "urn:tag:genre:music:pop", "urn:tag:genre:music:rock", "urn:tag:genre:music:hip-hop",
-            "urn:tag:genre:music:jazz", "urn:tag:genre:music:classical", "urn:tag:genre:music:electronic",
-            "urn:tag:genre:music:country", "urn:tag:genre:music:r&b", "urn:tag:genre:music:folk",
-            "urn:tag:genre:music:reggae", "urn:tag:genre:music:blues", "urn:tag:genre:music:indie",
-            "urn:tag:genre:music:ambient", "urn:tag:genre:music:punk", "urn:tag:genre:music:metal",
-            "urn:tag:genre:music:alternative", "urn:tag:genre:music:funk", "urn:tag:genre:music:soul",
-            "urn:tag:genre:music:world", "urn:tag:genre:music:acoustic", "urn:tag:genre:music:experimental"
-        ],
-        "book_categories": [
-            "urn:tag:genre:media:fiction", "urn:tag:genre:media:non-fiction", "urn:tag:genre:media:biography",
-            "urn:tag:genre:media:memoir", "urn:tag:genre:media:history", "urn:tag:genre:media:philosophy",
-            "urn:tag:genre:media:science", "urn:tag:genre:media:self-help", "urn:tag:genre:media:psychology",
-            "urn:tag:genre:media:poetry", "urn:tag:genre:media:mystery", "urn:tag:genre:media:romance",
-            "urn:tag:genre:media:fantasy", "urn:tag:genre:media:sci-fi", "urn:tag:genre:media:thriller",
-            "urn:tag:genre:media:adventure", "urn:tag:genre:media:business", "urn:tag:genre:media:health",
-            "urn:tag:genre:media:spirituality", "urn:tag:genre:media:travel", "urn:tag:genre:media:cooking"
-        ],
-        "podcast_types": [
-            "urn:tag:genre:media:comedy", "urn:tag:genre:media:education", "urn:tag:genre:media:news",
-            "urn:tag:genre:media:storytelling", "urn:tag:genre:media:true-crime", "urn:tag:genre:media:business",
-            "urn:tag:genre:media:health", "urn:tag:genre:media:technology", "urn:tag:genre:media:science",
-            "urn:tag:genre:media:history", "urn:tag:genre:media:philosophy", "urn:tag:genre:media:motivation",
-            "urn:tag:genre:media:mindfulness", "urn:tag:genre:media:interview", "urn:tag:genre:media:culture",
-            "urn:tag:genre:media:politics", "urn:tag:genre:media:sports", "urn:tag:genre:media:arts"
-        ],
-        "destination_vibes": [
-            "urn:tag:region:global:adventure", "urn:tag:region:global:relaxing", "urn:tag:region:global:cultural",
-            "urn:tag:region:global:scenic", "urn:tag:region:global:urban", "urn:tag:region:global:quiet",
-            "urn:tag:region:global:vibrant", "urn:tag:region:global:historic", "urn:tag:region:global:nature",
-            "urn:tag:region:global:beach", "urn:tag:region:global:mountain", "urn:tag:region:global:tropical",
-            "urn:tag:region:global:romantic", "urn:tag:region:global:family", "urn:tag:region:global:luxury",
-            "urn:tag:region:global:budget", "urn:tag:region:global:exotic", "urn:tag:region:global:spiritual"
-        ]
-    }
+@st.cache_resource
+def start_metrics_exporter():
+    """Streamlit can't add routes, so /metrics and /readyz get their own port when MOODFLOW_METRICS_PORT is set"""
+    port = os.environ.get("MOODFLOW_METRICS_PORT")
+    # /readyz answers 503 until the Qloo cache warm-up has finished its first pass, so a health check can hold traffic
+    readiness = engine.warmer.progress if engine.warmer is not None else None
+    return metrics.serve(int(port), readiness=readiness) if port else None
 
-def analyze_mood_and_generate_dynamic_tags(mood_description, time_context="", activity_preferences=None):
-    """Use OpenAI to analyze mood and dynamically select the best Qloo tags"""
-    try:
-        activity_list = ", ".join(activity_preferences) if activity_preferences else "all content types"
-        available_tags = get_available_qloo_tags()
-        
-        prompt = f"""
-        MOOD TO ANALYZE: "{mood_description}"
-        TIME CONTEXT: {time_context}
-        USER INTERESTS: {activity_list}
-        
-        You are an expert mood analyst and content curator. Your job is to:
-        1. Deeply analyze this person's emotional state and needs
-        2. Select the MOST appropriate Qloo API tags from the available options
-        3. Provide reasoning for your selections
-        
-        AVAILABLE QLOO TAGS:
-        Movie Genres: {', '.join(available_tags['movie_genres'])}
-        Music Genres: {', '.join(available_tags['music_genres'])}
-        Book Categories: {', '.join(available_tags['book_categories'])}
-        Podcast Types: {', '.join(available_tags['podcast_types'])}
-        Destination Vibes: {', '.join(available_tags['destination_vibes'])}
-        
-        Based on the mood analysis, provide a JSON response with this structure:
-        {{
-            "mood_interpretation": "Empathetic interpretation of their emotional state and what they might need",
-            "energy_level": "low/medium/high",
-            "emotional_tone": "positive/negative/neutral/mixed/complex",
-            "psychological_needs": "What this person psychologically needs right now (comfort, stimulation, escape, reflection, etc.)",
-            "selected_tags": {{
-                "movie": "exact tag from movie genres list that best matches their emotional needs",
-                "music": "exact tag from music genres list that best matches their emotional needs", 
-                "book": "exact tag from book categories list that best matches their emotional needs",
-                "podcast": "exact tag from podcast types list that best matches their emotional needs",
-                "destination": "exact tag from destination vibes list that best matches their emotional needs"
-            }},
-            "tag_reasoning": {{
-                "movie": "Why this movie genre specifically matches their mood and psychological needs",
-                "music": "Why this music genre specifically matches their mood and psychological needs",
-                "book": "Why this book category specifically matches their mood and psychological needs", 
-                "podcast": "Why this podcast type specifically matches their mood and psychological needs",
-                "destination": "Why this destination vibe specifically matches their mood and psychological needs"
-            }},
-            "overall_strategy": "Brief explanation of the overall content strategy for this mood"
-        }}
-        
-        IMPORTANT RULES:
-        - Select tags that will genuinely help this person's current emotional state
-        - Consider what they need psychologically (comfort vs stimulation, escapism vs reflection, etc.)
-        - Use EXACT tag strings from the provided lists
-        - Be specific and thoughtful in your reasoning
-        - Consider how different content types work together to create a cohesive mood experience
-        - Time context should influence selections (morning = energizing, evening = calming, etc.)
-        """
-        
-        response = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are an expert psychologist and content curator who understands how different media affects human emotions and psychological states. You select content that genuinely helps people based on their current emotional needs."},
-                {"role": "user", "content": prompt}
-            ],
-            model="gpt-4.1",
-            max_tokens=800,
-            temperature=0.7
-        )
-        
-        # Parse the JSON response
-        analysis = json.loads(response.choices[0].message.content.strip())
-        return analysis
-        
-    except Exception as e:
-        st.error(f"Error in dynamic mood analysis: {e}")
-        # Fallback to safe defaults
-        return {
-            "mood_interpretation": f"Understanding your current state: {mood_description}",
-            "energy_level": "medium",
-            "emotional_tone": "mixed",
-            "psychological_needs": "balance and comfort",
-            "selected_tags": {
-                "movie": "urn:tag:genre:media:drama",
-                "music": "urn:tag:genre:music:indie", 
-                "book": "urn:tag:genre:media:fiction",
-                "podcast": "urn:tag:genre:media:storytelling",
-                "destination": "urn:tag:region:global:scenic"
-            },
-            "tag_reasoning": {
-                "movie": "Drama provides emotional depth and relatability",
-                "music": "Indie music offers artistic authenticity and emotional nuance",
-                "book": "Fiction allows for emotional exploration and escapism",
-                "podcast": "Storytelling provides narrative engagement",
-                "destination": "Scenic locations offer peaceful reflection opportunities"
-            },
-            "overall_strategy": "Providing balanced content for emotional equilibrium and gentle engagement."
-        }
+@st.cache_resource
+def start_image_proxy():
+    """The thumbnail proxy for the cards, on its own port when MOODFLOW_IMAGE_PROXY_PORT is set"""
+    port = os.environ.get("MOODFLOW_IMAGE_PROXY_PORT")
+    return thumbnails.serve(int(port)) if port else None
 
-def get_qloo_recommendations(domain_type, tag):
-    """Fetch recommendations from Qloo API"""
-    try:
-        response = requests.get(
-            QLOO_BASE_URL,
-            headers={"x-api-key": QLOO_API_KEY},
-            params={
-                "filter.type": f"urn:entity:{domain_type}",
-                "filter.tags": tag
-            }
-        )
-        
-        if response.ok:
-            data = response.json()
-            entities = data.get("results", {}).get("entities", [])
-            return entities[:4]  # Return top 4 recommendations
-        else:
-            st.error(f"Qloo API error for {domain_type}: {response.status_code}")
-            return []
-    except Exception as e:
-        st.error(f"Error fetching {domain_type} from Qloo: {e}")
-        return []
+engine = get_engine(OPENAI_API_KEY, QLOO_API_KEY)
+start_metrics_exporter()
+start_image_proxy()
 
-def generate_final_summary(mood, mood_analysis, recommendations):
-    """Generate a personalized final summary based on AI analysis"""
-    try:
-        rec_summary = []
-        for category, items in recommendations.items():
-            if items:
-                rec_summary.append(f"{category.title()}: {', '.join([item.get('name', 'Unknown') for item in items[:2]])}")
-        
-        prompt = f"""
-        USER'S ORIGINAL MOOD: "{mood}"
-        AI MOOD INTERPRETATION: {mood_analysis.get('mood_interpretation', '')}
-        PSYCHOLOGICAL NEEDS IDENTIFIED: {mood_analysis.get('psychological_needs', '')}
-        OVERALL CONTENT STRATEGY: {mood_analysis.get('overall_strategy', '')}
-        ACTUAL RECOMMENDATIONS FOUND: {'; '.join(rec_summary)}
-        
-        Create a warm, personalized, and psychologically insightful 3-4 sentence summary that:
-        1. Acknowledges their specific emotional state with empathy
-        2. Explains how this curated collection addresses their psychological needs
-        3. Describes how the different content types work synergistically
-        4. Provides encouraging words for their journey
-        
-        Make it feel like advice from a caring friend who truly understands their emotional state.
-        """
+class StreamlitListener(PipelineListener):
+    """Renders each piece of a run into placeholders as soon as the engine has it.
+
+    The styled panels below the handler take over once the run finishes, so
+    ``clear`` removes these live previews.
+    """
+    
+    def __init__(self, user_mood, activity_preferences):
+        self.user_mood = user_mood
+        self.expected = max(len(domains_for_preferences(activity_preferences)), 1)
+        self.finished = 0
+        self.interpretation_slot = st.empty()
+        self.progress_bar = st.progress(0)
+        self.live_slot = st.empty()
+        self.live_columns = self.live_slot.container().columns(2)
+        self.domain_slots = {}
+    
+    def on_interpretation(self, text):
+        # Show the interpretation while the model is still choosing tags
+        self.interpretation_slot.markdown(f"""
+        <div class="analysis-box">
+            <h3><span class="mood-emoji">🎭</span>Understanding You</h3>
+            <p><strong>"{self.user_mood}"</strong></p>
+            <p><em>{text}</em></p>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    def on_fetch_started(self, entity_type):
+        with self.live_columns[len(self.domain_slots) % 2]:
+            self.domain_slots[entity_type] = st.empty()
+    
+    def on_fetch_finished(self, entity_type, items, error):
+        with self.domain_slots[entity_type].container():
+            render_domain_recommendations(entity_type, items)
+        self.finished += 1
+        self.progress_bar.progress(min(self.finished / self.expected, 1.0))
+    
+    def on_error(self, message):
+        st.error(message)
+    
+    def clear(self):
+        self.progress_bar.empty()
+        self.interpretation_slot.empty()
+        self.live_slot.empty()
+
+def current_results():
+    """This session's last run, loaded by reference; None before the first run or once it has expired"""
+    refs = st.session_state.result_refs
+    return engine.store.load_result(refs) if refs else None
+
+def show_more(domain):
+    st.session_state.result_offsets[domain] = st.session_state.result_offsets.get(domain, 0) + engine.config.results_per_domain
+
+@st.fragment
+def recommendations_panel():
+    """The recommendation cards; "More like this" reruns only this fragment, not the whole script"""
+    results = current_results()
+    if results is None:
+        return
+    page_size = engine.config.results_per_domain
+    tags = analysis_tags(results['analysis'])
+    
+    # Create columns for better layout
+    col1, col2 = st.columns(2)
+    
+    col_index = 0
+    for domain, items in results['recommendations'].items():
+        current_col = col1 if col_index % 2 == 0 else col2
+        pool = results['candidates'].get(domain, [])
+        offset = st.session_state.result_offsets.get(domain, 0)
+        if offset:
+            # Re-ranked locally from the candidates already fetched; no Qloo call
+            items = page(pool, tags, offset, page_size)
         
-        response = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a compassionate lifestyle coach and emotional intelligence expert who creates deeply personalized, psychologically aware summaries that make people feel understood and cared for."},
-                {"role": "user", "content": prompt}
-            ],
-            model="gpt-4.1",
-            max_tokens=200,
-            temperature=0.8
-        )
+        with current_col:
+            render_domain_recommendations(domain, items)
+            if len(pool) > page_size:
+                st.button("🔁 More like this", key=f"more_{domain}", on_click=show_more, args=(domain,))
         
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Your personalized content collection has been carefully curated to support your current emotional journey: {mood}. Each recommendation works together to provide exactly what you need right now. Trust the process and enjoy this thoughtfully designed experience!"
+        col_index += 1
 
 # Main App Interface
-st.markdown("""
-<div class="main-header">
-    <h1>🧘 MoodFlow</h1>
-    <h3>Your Personal Lifestyle Companion</h3>
-    <p>Advanced AI-powered dynamic mood analysis for truly personalized content discovery</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # Sidebar for mood input
 with st.sidebar:
@@ -343,7 +189,7 @@ with st.sidebar:
     # Activity preferences
     activity_preferences = st.multiselect(
         "What content types interest you?",
-        ["Movies", "Music", "Books", "Podcasts", "Travel Ideas"],
+        PREFERENCE_OPTIONS,
         default=["Movies", "Books"]
     )
     
@@ -356,55 +202,56 @@ with st.sidebar:
     st.markdown("---")
     st.info("Our AI now dynamically understands your emotional needs and selects perfect content matches in real-time.")
 
+def render_summary(text):
+    st.markdown("---")
+    st.markdown("### 💫 Your Personalized Journey")
+    st.markdown(summary_html(text), unsafe_allow_html=True)
+
+@st.fragment(run_every=SUMMARY_POLL_SECONDS)
+def pending_summary_panel():
+    """The summary panel while the LLM summary streams in; only this fragment reruns meanwhile"""
+    pending = st.session_state.pending_summary
+    if pending is None:
+        return
+    pending["text"] += "".join(pending["stream"].drain())
+    finished = pending["stream"].closed
+    if finished or time.monotonic() - pending["since"] > SUMMARY_DEADLINE_SECONDS:
+        st.session_state.pending_summary = None
+        llm_summary = pending["text"].strip()
+        # A summary cut off by the deadline is dropped; the template stays
+        if finished and llm_summary:
+            st.session_state.result_refs["summary"] = engine.store.put("summary", llm_summary)
+        # One full rerun draws the finished panel without a poller behind it
+        st.rerun(scope="app")
+    results = current_results()
+    if results and results['summary']:
+        render_summary(pending["text"] or results['summary'])
+        st.caption("✍️ Personalizing your summary…")
+
 # Main content area
 if user_mood.strip():
     if st.button("✨ Find What I Need Right Now", key="analyze_mood"):
         with st.spinner("🧠 Understanding your emotional needs and finding perfect matches..."):
             
-            # Combine mood with additional context
-            full_mood_description = user_mood
-            if additional_context:
-                full_mood_description += f" Additional context: {additional_context}"
-            
-            # Step 1: AI Mood Analysis with Dynamic Tag Selection
             st.session_state.current_mood = user_mood
-            mood_analysis = analyze_mood_and_generate_dynamic_tags(full_mood_description, time_context, activity_preferences)
-            st.session_state.mood_analysis = mood_analysis
-            st.session_state.dynamic_tags = mood_analysis.get('selected_tags', {})
-            
-            # Step 2: Fetch recommendations using AI-selected tags
-            recommendations = {}
-            domain_mapping = {
-                "movie": "movie",
-                "music": "artist", 
-                "book": "book",
-                "podcast": "podcast",
-                "destination": "destination"
-            }
+            listener = StreamlitListener(user_mood, activity_preferences)
+            result = engine.run(user_mood, time_context, activity_preferences, additional_context, listener=listener, defer_summary=True)
+            listener.clear()
             
-            progress_bar = st.progress(0)
-            total_domains = len(st.session_state.dynamic_tags)
-            
-            for i, (content_type, tag) in enumerate(st.session_state.dynamic_tags.items()):
-                domain = domain_mapping.get(content_type)
-                if domain and any(content_type in pref.lower().replace('s', '') for pref in activity_preferences):
-                    recommendations[domain] = get_qloo_recommendations(domain, tag)
-                    progress_bar.progress((i + 1) / total_domains)
-                    time.sleep(0.3)  # Small delay for UX
-            
-            st.session_state.recommendations = recommendations
-            
-            # Step 3: Generate final summary
-            final_summary = generate_final_summary(user_mood, mood_analysis, recommendations)
-            st.session_state.ai_summary = final_summary
-            
-            progress_bar.empty()
+            st.session_state.result_refs = engine.store.save_result(result)
+            st.session_state.pending_summary = None
+            if result.pending_summary is not None:
+                st.session_state.pending_summary = {"stream": result.pending_summary, "text": "", "since": time.monotonic()}
+            st.session_state.result_offsets = {}
+            st.session_state.stage_timings = result.timings
+            st.session_state.critical_path = result.critical_path
 
 # Display results
-if st.session_state.get('mood_analysis') and st.session_state.get('current_mood'):
+results = current_results()
+if results and results['analysis'] and st.session_state.get('current_mood'):
     
     # Display AI mood analysis
-    analysis = st.session_state.mood_analysis
+    analysis = results['analysis']
     st.markdown(f"""
     <div class="analysis-box">
         <h3><span class="mood-emoji">🎭</span>Understanding You</h3>
@@ -419,98 +266,32 @@ if st.session_state.get('mood_analysis') and st.session_state.get('current_mood'
         chars = {}
         tag_reasoning = analysis.get('tag_reasoning', {})
         
-        for content_type, tag in st.session_state.dynamic_tags.items():
-            tag_name = tag.split(':')[-1].replace('-', ' ').title()
-            chars[content_type] = tag_name
+        for content_type, tag in analysis.get('selected_tags', {}).items():
+            chars[content_type] = tag_label(tag)
         
         st.markdown("### 🎯 Your Personal Content Profile")
-        col1, col2, col3, col4, col5 = st.columns(5)
+        profile = [(DOMAINS_BY_KEY[content_type], name) for content_type, name in chars.items() if content_type in DOMAINS_BY_KEY]
         
-        with col1:
-            if 'movie' in chars:
-                st.metric("🎬 Movies", chars['movie'])
-        with col2:
-            if 'music' in chars:
-                st.metric("🎵 Music", chars['music'])
-        with col3:
-            if 'book' in chars:
-                st.metric("📚 Books", chars['book'])
-        with col4:
-            if 'podcast' in chars:
-                st.metric("🎧 Podcasts", chars['podcast'])
-        with col5:
-            if 'destination' in chars:
-                st.metric("✈️ Travel", chars['destination'])
+        for col, (domain, tag_name) in zip(st.columns(5), profile):
+            with col:
+                st.metric(f"{domain.emoji} {domain.metric_label}", tag_name)
 
 # Display recommendations
-if st.session_state.get('recommendations'):
+if results and results['recommendations']:
     st.header("✨ Curated Just for You")
     
-    # Create columns for better layout
-    col1, col2 = st.columns(2)
-    
-    domain_names = {
-        "movie": "Movies & Shows",
-        "artist": "Music Artists", 
-        "book": "Books",
-        "podcast": "Podcasts",
-        "destination": "Travel Destinations"
-    }
+    recommendations_panel()
     
-    domain_emojis = {
-        "movie": "🎬",
-        "artist": "🎵", 
-        "book": "📚",
-        "podcast": "🎧",
-        "destination": "✈️"
-    }
+    # Display AI-generated final summary; it keeps generating in the background, surviving reruns
+    if st.session_state.pending_summary is not None:
+        pending_summary_panel()
+    elif results['summary']:
+        render_summary(results['summary'])
     
-    col_index = 0
-    for domain, items in st.session_state.recommendations.items():
-        current_col = col1 if col_index % 2 == 0 else col2
-        
-        with current_col:
-            st.markdown(f"""
-            <div class="category-header">
-                {domain_emojis.get(domain, "🎯")} {domain_names.get(domain, domain.title())}
-            </div>
-            """, unsafe_allow_html=True)
-            
-            if items:
-                for i, item in enumerate(items):
-                    name = item.get('name', 'Unknown')
-                    props = item.get('properties', {})
-                    description = props.get('description', 'No description available')
-                    image_url = props.get('image', {}).get('url', '') if 'image' in props else ''
-                    
-                    # Create clean recommendation card
-                    card_html = f"""
-                    <div class="recommendation-card">
-                        <h4>{name}</h4>
-                        <p style="color: #666; font-size: 0.9rem;">{description}</p>
-                    """
-                    
-                    if image_url:
-                        card_html += f'<img src="{image_url}" style="width:100%; max-width:180px; border-radius:8px; margin-top:8px;">'
-                    
-                    card_html += "</div>"
-                    st.markdown(card_html, unsafe_allow_html=True)
-            else:
-                st.info(f"No {domain} recommendations found for the AI-selected tags. The AI chose very specific criteria - try describing your mood with different nuances.")
-        
-        col_index += 1
-    
-    # Display AI-generated final summary
-    if st.session_state.get('ai_summary'):
-        st.markdown("---")
-        st.markdown("### 💫 Your Personalized Journey")
-        st.markdown(f"""
-        <div style="background: linear-gradient(135deg, #ffecd2 0%, #fcb69f 100%); 
-                    padding: 1.5rem; border-radius: 15px; color: #333; 
-                    font-size: 1.1rem; line-height: 1.6; font-style: italic;">
-            {st.session_state.ai_summary}
-        </div>
-        """, unsafe_allow_html=True)
+    if SHOW_TIMINGS and st.session_state.get('stage_timings'):
+        with st.expander("⏱️ Pipeline timings"):
+            st.caption("Critical path: " + " → ".join(st.session_state.get('critical_path', [])))
+            st.dataframe(st.session_state.stage_timings, use_container_width=True)
         
 
 
@@ -535,9 +316,4 @@ if not user_mood.strip():
 
 # Footer
 st.markdown("---")
-st.markdown("""
-<div style="text-align: center; color: #666; padding: 2rem;">
-    <p>✨ MoodFlow - Where AI meets emotional intelligence ✨</p>
-    <p><small>Powered by advanced mood understanding and dynamic content curation</small></p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)
@@ -0,0 +1,191 @@
+"""Mood archetypes: a precomputed mood -> tags table that answers common moods without an LLM call.
+
+Analyses are cheap to reuse because they live in a small space (energy x
+tone x time of day -> one tag per domain). The offline build clusters
+analysed moods, for example the output of ``python -m batch``, into
+archetypes and keeps the majority tags, energy and tone of each one, with
+per-tag reasoning. No free text written about any one mood is kept; the
+interpretation, needs and strategy served for an archetype are built from its
+energy and tone (``generic_analysis``):
+
+    python -m batch seeds.jsonl -o analysed.jsonl
+    python -m archetypes analysed.jsonl -o archetypes.json
+
+At request time ``ArchetypeTable.analysis_for`` embeds the mood with the mood
+cache's local hashing embedder and takes the nearest archetype centroid in the
+same time context. Below ``threshold`` similarity it returns None and the
+caller runs the full LLM analysis.
+"""
+import argparse
+import json
+import sys
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from domains import DOMAINS, DOMAINS_BY_KEY, domains_for_preferences
+from mood_analysis import default_reasoning, generic_analysis
+from mood_cache import EMBEDDING_DIM, embed_mood, mood_negations, normalize_mood
+from tag_index import TAG_INDEX
+
+DEFAULT_CLUSTER_THRESHOLD = 0.7
+DEFAULT_MATCH_THRESHOLD = 0.8
+
+
+def build_archetypes(rows, cluster_threshold=DEFAULT_CLUSTER_THRESHOLD, min_size=2):
+    """Cluster analysed moods into archetypes.
+
+    ``rows`` are dicts with ``mood``, ``time_context`` and ``analysis``, as
+    written by batch mode. Moods are clustered greedily per (time context,
+    negations) by cosine similarity to each cluster's running centroid;
+    clusters smaller than ``min_size`` are dropped.
+    """
+    by_context = defaultdict(list)
+    for row in rows:
+        if row.get("errors") or not row.get("analysis", {}).get("selected_tags"):
+            continue  # Fallback analyses would teach the table the defaults
+        by_context[(row.get("time_context") or "", mood_negations(row["mood"]))].append(row)
+
+    archetypes = []
+    for (time_context, negations), members in sorted(by_context.items(), key=lambda kv: (kv[0][0], sorted(kv[0][1]))):
+        clusters = []  # [summed vector, rows, vectors]
+        for row in members:
+            vector = embed_mood(row["mood"])
+            best, best_score = None, cluster_threshold
+            for cluster in clusters:
+                centroid = cluster[0] / np.linalg.norm(cluster[0])
+                score = float(centroid @ vector)
+                if score >= best_score:
+                    best, best_score = cluster, score
+            if best is None:
+                clusters.append([vector.copy(), [row], [vector]])
+            else:
+                best[0] += vector
+                best[1].append(row)
+                best[2].append(vector)
+
+        for total, cluster_rows, vectors in clusters:
+            if len(cluster_rows) < min_size:
+                continue
+            centroid = total / np.linalg.norm(total)
+            medoid = cluster_rows[int(np.argmax(np.stack(vectors) @ centroid))]
+            archetypes.append(_archetype(len(archetypes), time_context, negations, centroid, cluster_rows, medoid))
+    return archetypes
+
+
+def _archetype(index, time_context, negations, centroid, rows, medoid):
+    """Majority tags, energy and tone across the cluster; each tag's reasoning prefers its medoid's"""
+    analysis = {
+        key: Counter(row["analysis"].get(key) for row in rows).most_common(1)[0][0]
+        for key in ("energy_level", "emotional_tone")
+    }
+
+    analysis["selected_tags"], analysis["tag_reasoning"] = {}, {}
+    for domain in DOMAINS:
+        votes = Counter(row["analysis"]["selected_tags"].get(domain.key) for row in rows)
+        votes.pop(None, None)
+        if not votes:
+            continue
+        tag = votes.most_common(1)[0][0]
+        analysis["selected_tags"][domain.key] = tag
+        voters = [row for row in rows if row["analysis"]["selected_tags"].get(domain.key) == tag]
+        source = medoid if medoid in voters else voters[0]
+        analysis["tag_reasoning"][domain.key] = source["analysis"].get("tag_reasoning", {}).get(domain.key) or default_reasoning(domain, tag)
+
+    return {
+        "id": index,
+        "time_context": time_context,
+        "negations": sorted(negations),
+        "size": len(rows),
+        "examples": [normalize_mood(row["mood"]) for row in rows[:5]],
+        "centroid": [round(float(x), 5) for x in centroid],
+        "analysis": analysis,
+    }
+
+
+class ArchetypeTable:
+    """Nearest-archetype lookup over a table written by ``build_archetypes``"""
+
+    def __init__(self, archetypes, threshold=DEFAULT_MATCH_THRESHOLD):
+        # A table built against an older vocabulary may name tags we no longer offer
+        self.archetypes = [a for a in archetypes if all(
+            key in DOMAINS_BY_KEY and TAG_INDEX.id_of(DOMAINS_BY_KEY[key].tag_category, tag) is not None
+            for key, tag in a["analysis"]["selected_tags"].items()
+        )]
+        self.threshold = threshold
+        self._centroids = np.array([a["centroid"] for a in self.archetypes], dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        self._keys = [(a["time_context"], frozenset(a["negations"])) for a in self.archetypes]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path, threshold=DEFAULT_MATCH_THRESHOLD):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["archetypes"], threshold)
+
+    def classify(self, mood, time_context=""):
+        """(archetype, similarity) for the nearest archetype in this time context, or (None, 0.0)"""
+        if not self.archetypes:
+            return None, 0.0
+        key = (time_context or "", mood_negations(mood))
+        scores = self._centroids @ embed_mood(mood)
+        for i in np.argsort(-scores):
+            if self._keys[i] == key:
+                return self.archetypes[i], float(scores[i])
+        return None, 0.0
+
+    def analysis_for(self, mood, time_context="", activity_preferences=None):
+        """An analysis for the selected domains from a confident match, else None"""
+        archetype, similarity = self.classify(mood, time_context)
+        domains = domains_for_preferences(activity_preferences)
+        confident = archetype is not None and similarity >= self.threshold and all(
+            domain.key in archetype["analysis"]["selected_tags"] for domain in domains
+        )
+        with self._lock:
+            if confident:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not confident:
+            return None
+        # Tables built before prose was left out may still carry some; it is never served
+        analysis = generic_analysis(archetype["analysis"])
+        analysis["selected_tags"] = {d.key: analysis["selected_tags"][d.key] for d in domains}
+        analysis["tag_reasoning"] = {d.key: analysis["tag_reasoning"][d.key] for d in domains}
+        return analysis
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "archetypes": len(self.archetypes),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="analysed moods as JSONL (batch mode output)")
+    parser.add_argument("-o", "--output", required=True, help="archetype table to write (JSON)")
+    parser.add_argument("--cluster-threshold", type=float, default=DEFAULT_CLUSTER_THRESHOLD,
+                        help="similarity to a cluster's centroid needed to join it")
+    parser.add_argument("--min-size", type=int, default=2, help="drop archetypes seen fewer times than this")
+    args = parser.parse_args(argv)
+
+    with open(args.input, encoding="utf-8") as f:
+        rows = [json.loads(text) for text in f if text.strip()]
+    archetypes = build_archetypes(rows, args.cluster_threshold, args.min_size)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"dim": EMBEDDING_DIM, "archetypes": archetypes}, f)
+    covered = sum(a["size"] for a in archetypes)
+    print(f"{len(archetypes)} archetypes covering {covered} of {len(rows)} moods -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""Batch mode: recommendations for a whole file of moods, written out as the batch runs.
+
+    python -m batch moods.jsonl -o results.jsonl --concurrency 8
+    python -m batch moods.csv -o results.jsonl --resume           # skip ids already in results.jsonl
+    python -m batch moods.jsonl --export-analysis analysis.jsonl  # OpenAI Batch API input, no live calls
+    python -m batch moods.jsonl -o results.jsonl --analysis-results batch_output.jsonl \\
+        --export-summaries summaries.jsonl
+
+Input rows need a ``mood`` and may carry ``id``, ``time_context``,
+``preferences`` (a list, or ``;``-separated in CSV) and ``additional_context``.
+Identical and near-identical moods with the same time and preferences are
+analysed once and share one result, each Qloo (type, tag) is fetched once per
+batch, and the output file doubles as the checkpoint for ``--resume``.
+"""
+import argparse
+import contextvars
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import List
+
+from domains import PREFERENCE_OPTIONS, domains_for_preferences
+from engine import EngineConfig, MoodFlowEngine, RecommendationResult, build_analysis_request, build_summary_request
+from mood_analysis import parse_analysis
+from mood_cache import MoodAnalysisCache
+from rerank import analysis_tags, rank_entities
+from scheduler import BATCH, lane
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+# Stricter than the interactive mood cache: a shared batch result should read as the same mood
+DEFAULT_DEDUPE_THRESHOLD = 0.92
+
+
+@dataclass
+class BatchItem:
+    id: str
+    mood: str
+    time_context: str = ""
+    preferences: List[str] = field(default_factory=list)
+    additional_context: str = ""
+
+    @property
+    def description(self):
+        """The mood text the analysis sees, as in MoodFlowEngine.run"""
+        if self.additional_context:
+            return f"{self.mood} Additional context: {self.additional_context}"
+        return self.mood
+
+
+def _item(row, line):
+    mood = (row.get("mood") or "").strip()
+    if not mood:
+        raise ValueError(f"line {line}: 'mood' is required")
+    preferences = row.get("preferences") or []
+    if isinstance(preferences, str):
+        preferences = [p.strip() for p in preferences.split(";") if p.strip()]
+    unknown = [p for p in preferences if p not in PREFERENCE_OPTIONS]
+    if unknown:
+        raise ValueError(f"line {line}: unknown preferences {unknown}; use {PREFERENCE_OPTIONS}")
+    return BatchItem(
+        id=str(row.get("id") or line),
+        mood=mood,
+        time_context=row.get("time_context") or "",
+        preferences=preferences,
+        additional_context=row.get("additional_context") or "",
+    )
+
+
+def read_items(path):
+    """BatchItems from a JSONL or CSV file (by extension); ids default to the line number"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            return [_item(row, line) for line, row in enumerate(csv.DictReader(f), start=2)]
+        return [_item(json.loads(text), line) for line, text in enumerate(f, start=1) if text.strip()]
+
+
+def group_items(items, threshold=DEFAULT_DEDUPE_THRESHOLD):
+    """Group identical and near-identical moods; the first item of each group is analysed for all of it"""
+    index = MoodAnalysisCache(capacity=max(1, len(items)), threshold=threshold)
+    groups = []
+    for item in items:
+        group, _ = index.match(item.description, item.time_context, item.preferences)
+        if group is None:
+            group = []
+            groups.append(group)
+            index.put(item.description, item.time_context, item.preferences, group)
+        group.append(item)
+    return groups
+
+
+def completed_ids(path):
+    """Ids already written to an output file; a torn last line from a crash is ignored"""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for text in f:
+            try:
+                done.add(json.loads(text)["id"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def _end_torn_line(path):
+    """Terminate a half-written last line so appended rows start on their own line"""
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def _batch_line(custom_id, body):
+    """One request in the OpenAI Batch API input format"""
+    return json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}) + "\n"
+
+
+def load_batch_results(path):
+    """custom_id -> completion text from an OpenAI Batch API output file"""
+    results = {}
+    with open(path, encoding="utf-8") as f:
+        for text in f:
+            if not text.strip():
+                continue
+            record = json.loads(text)
+            try:
+                results[record["custom_id"]] = record["response"]["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                logger.warning("No completion for %s in batch results", record.get("custom_id"))
+    return results
+
+
+class BatchRunner:
+    """Runs grouped moods through an engine with bounded concurrency.
+
+    Analyses come from the live API, or from a finished Batch API job when
+    ``analysis_results`` is given. Summaries are generated live, or written as
+    Batch API requests to ``summary_requests`` (rows then carry no summary; the
+    request's custom_id is ``summary-<group>``).
+    """
+
+    def __init__(self, engine, concurrency=DEFAULT_CONCURRENCY, analysis_results=None, summary_requests=None):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.analysis_results = analysis_results or {}
+        self.summary_requests = summary_requests
+        self._lookups = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, entity_type, tag):
+        """(entities, error) for one Qloo query; successes are fetched at most once per batch"""
+        key = (entity_type, tag)
+        with self._lock:
+            if key in self._lookups:
+                return self._lookups[key], None
+        # Concurrent first lookups of one key are coalesced by the engine's cache
+        try:
+            entities = self.engine.get_qloo_recommendations(entity_type, tag)
+        except Exception as e:
+            # Not remembered: a transient failure or 429 shouldn't fail every later row with this query
+            return [], f"Error fetching {entity_type} from Qloo: {e}"
+        with self._lock:
+            return self._lookups.setdefault(key, entities), None
+
+    def _analysis(self, item, errors):
+        content = self.analysis_results.get(f"analysis-{item.id}")
+        if content is None:
+            return self.engine.analyze_mood_and_generate_dynamic_tags(
+                item.description, item.time_context, item.preferences, on_error=errors.append
+            )
+        analysis, _ = parse_analysis(content, item.description, domains_for_preferences(item.preferences))
+        return analysis
+
+    def process(self, group):
+        """Output rows for every item of a group, from one analysis of its first item"""
+        first = group[0]
+        errors = []
+        analysis = self._analysis(first, errors)
+
+        expected = {domain.key: domain.entity_type for domain in domains_for_preferences(first.preferences)}
+        recommendations = {}
+        for content_type, tag in analysis.get("selected_tags", {}).items():
+            if content_type in expected:
+                entities, error = self.lookup(expected[content_type], tag)
+                ranked = rank_entities(entities, analysis_tags(analysis))
+                recommendations[expected[content_type]] = ranked[:self.engine.config.results_per_domain]
+                if error:
+                    errors.append(error)
+
+        if self.summary_requests is None:
+            summary = self.engine.generate_final_summary(first.mood, analysis, recommendations)
+        else:
+            summary = None
+            body = build_summary_request(first.mood, analysis, recommendations, self.engine.config.model)
+            self.summary_requests(_batch_line(f"summary-{first.id}", body))
+
+        return [
+            {"id": item.id, "group": first.id, **RecommendationResult(
+                mood=item.mood,
+                time_context=item.time_context,
+                preferences=item.preferences,
+                analysis=analysis,
+                recommendations=recommendations,
+                summary=summary,
+                errors=errors,
+            ).to_dict()}
+            for item in group
+        ]
+
+    def run(self, groups, write):
+        """Process groups concurrently, calling ``write(row)`` as each group finishes; returns stats"""
+        stats = {"groups": len(groups), "rows": 0, "failed_groups": 0}
+        # Upstream calls queue in the batch lane, behind any interactive traffic in this process
+        with lane(BATCH), ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="moodflow-batch") as pool:
+            futures = {pool.submit(contextvars.copy_context().run, self.process, group): group for group in groups}
+            for future in as_completed(futures):
+                try:
+                    rows = future.result()
+                except Exception:
+                    # Left out of the output, so a --resume run retries it
+                    logger.exception("Batch group %s failed", futures[future][0].id)
+                    stats["failed_groups"] += 1
+                    continue
+                for row in rows:
+                    write(row)
+                stats["rows"] += len(rows)
+        stats["qloo_lookups"] = len(self._lookups)
+        return stats
+
+
+def export_analysis_requests(groups, path, model):
+    """Write one Batch API analysis request per group; custom_id is ``analysis-<id of its first item>``"""
+    with open(path, "w", encoding="utf-8") as f:
+        for group in groups:
+            first = group[0]
+            body = build_analysis_request(first.description, first.time_context, first.preferences, model)
+            f.write(_batch_line(f"analysis-{first.id}", body))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="moods as .jsonl or .csv")
+    parser.add_argument("-o", "--output", help="results as JSONL, appended to and flushed as groups finish")
+    parser.add_argument("--resume", action="store_true", help="skip ids already present in --output")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--dedupe-threshold", type=float, default=DEFAULT_DEDUPE_THRESHOLD,
+                        help="cosine similarity at which two moods share a result (1.0: exact matches only)")
+    parser.add_argument("--export-analysis", metavar="PATH", help="write analysis prompts as Batch API input and exit")
+    parser.add_argument("--analysis-results", metavar="PATH", help="Batch API output to take analyses from")
+    parser.add_argument("--export-summaries", metavar="PATH", help="write summary prompts as Batch API input instead of calling the API")
+    parser.add_argument("--model", default=None, help="model for exported requests (default: MOODFLOW_MODEL or gpt-4.1)")
+    args = parser.parse_args(argv)
+    if not (args.output or args.export_analysis):
+        parser.error("--output is required unless --export-analysis is given")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per OpenAI call otherwise
+
+    items = read_items(args.input)
+    if args.resume and args.output:
+        done = completed_ids(args.output)
+        items = [item for item in items if item.id not in done]
+        logger.info("Resuming: %d already done, %d to go", len(done), len(items))
+    groups = group_items(items, args.dedupe_threshold)
+    logger.info("%d moods in %d groups", len(items), len(groups))
+
+    if args.export_analysis:
+        export_analysis_requests(groups, args.export_analysis, args.model or EngineConfig.from_env().model)
+        logger.info("Wrote %d analysis requests to %s", len(groups), args.export_analysis)
+        return 0
+
+    engine = MoodFlowEngine.from_env()
+    if args.model:
+        engine.config.model = args.model
+    analysis_results = load_batch_results(args.analysis_results) if args.analysis_results else None
+    write_lock = threading.Lock()
+    summaries = open(args.export_summaries, "a", encoding="utf-8") if args.export_summaries else None
+
+    def write_summary_request(line):
+        with write_lock:
+            summaries.write(line)
+            summaries.flush()
+
+    _end_torn_line(args.output)
+    with open(args.output, "a", encoding="utf-8") as out:
+        def write(row):
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+
+        runner = BatchRunner(engine, args.concurrency, analysis_results, write_summary_request if summaries else None)
+        try:
+            stats = runner.run(groups, write)
+        finally:
+            engine.close()
+            if summaries:
+                summaries.close()
+    logger.info("Done: %s", stats)
+    return 0 if not stats["failed_groups"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Local stand-ins for the Qloo insights API and the OpenAI chat-completions API.
+
+Both servers run on localhost threads with configurable latency distributions,
+error rates and payload sizes, and count every request they answer, so the
+benchmark can be run on a laptop with no network access.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class LatencyModel:
+    """Samples a delay in seconds: ``fixed:0.2``, ``uniform:0.1,0.4`` or ``lognormal:<median>,<sigma>``"""
+    kind: str = "fixed"
+    params: tuple = (0.0,)
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, args = spec.partition(":")
+        params = tuple(float(a) for a in args.split(",")) if args else (0.0,)
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"bad latency spec {spec!r}; use fixed:S, uniform:A,B or lognormal:MEDIAN,SIGMA")
+        return cls(kind, params)
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(0.0, sigma) * median
+
+    def __str__(self):
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+@dataclass
+class UpstreamProfile:
+    """How a fake upstream behaves"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    error_status: int = 503
+    seed: int = 0
+
+
+class _CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, profile):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.profile = profile
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(profile.seed)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is expected, not a failure
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def draw(self):
+        """(delay, fail) for one request; drawn under a lock so runs are reproducible per seed"""
+        with self._lock:
+            return self.profile.latency.sample(self._rng), self._rng.random() < self.profile.error_rate
+
+    def rng_choice(self, seq):
+        with self._lock:
+            return self._rng.choice(seq)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients behave as they do in production
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fail_if_drawn(self, fail, name):
+        if fail:
+            self.server.count(f"{name}:{self.server.profile.error_status}")
+            self._send_json(self.server.profile.error_status, {"error": "injected failure"})
+        return fail
+
+
+class _QlooHandler(_JSONHandler):
+    entities_per_response = 20
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self._send_json(200, self.server.snapshot())
+            return
+        delay, fail = self.server.draw()
+        time.sleep(delay)
+        if self._fail_if_drawn(fail, "insights"):
+            return
+        query = parse_qs(url.query)
+        entity_type = query.get("filter.type", ["urn:entity:unknown"])[0].split(":")[-1]
+        tag = query.get("filter.tags", [""])[0].split(":")[-1]
+        take = int(query.get("take", [self.entities_per_response])[0])
+        self.server.count("insights:200")
+        self._send_json(200, {"success": True, "results": {"entities": [
+            {
+                "name": f"{tag.title()} {entity_type} #{i}",
+                "entity_id": f"{entity_type}-{tag}-{i}",
+                "type": f"urn:entity:{entity_type}",
+                "popularity": round(1 - i / self.entities_per_response, 3),
+                "tags": [{"id": query.get("filter.tags", [""])[0], "name": tag, "type": "urn:tag:genre"}],
+                "properties": {
+                    "description": f"A {tag} {entity_type} picked for benchmarking. " * 3,
+                    "image": {"url": f"https://images.example.invalid/{entity_type}/{tag}/{i}.jpg"},
+                    "release_year": 2000 + i,
+                    "keywords": [{"name": f"keyword-{k}", "count": k} for k in range(10)],
+                },
+            }
+            for i in range(min(take, self.entities_per_response))
+        ]}})
+
+
+class _OpenAIHandler(_JSONHandler):
+    """Answers /v1/chat/completions: a schema-valid analysis when a JSON schema is requested, else prose.
+
+    The profile's latency is the time to first token; the rest of the
+    completion is paced at ``tokens_per_second``.
+    """
+    tokens_per_second = 200.0
+    summary_words = 70
+
+    def _content(self, request):
+        schema = (request.get("response_format") or {}).get("json_schema", {}).get("schema")
+        if not schema:
+            return " ".join(["Rest", "gently", "and", "let", "these", "picks", "carry", "you."] * (self.summary_words // 8))
+        props = schema["properties"]
+        tag_props = props["selected_tags"]["properties"]
+        return json.dumps({
+            "mood_interpretation": "You sound worn down and in need of something gentle that asks little of you.",
+            "energy_level": self.server.rng_choice(props["energy_level"]["enum"]),
+            "emotional_tone": self.server.rng_choice(props["emotional_tone"]["enum"]),
+            "psychological_needs": "comfort and low-effort engagement",
+            "selected_tags": {key: self.server.rng_choice(spec["enum"]) for key, spec in tag_props.items()},
+            "tag_reasoning": {key: f"A calm {key} choice that meets you where you are today." for key in tag_props},
+            "overall_strategy": "Keep everything soft, warm and undemanding.",
+        })
+
+    def _usage(self, request, content):
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+        completion_tokens = max(1, len(content) // 4)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/v1/chat/completions":
+            self._send_json(404, {"error": "not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        delay, fail = self.server.draw()
+        time.sleep(delay)
+        if self._fail_if_drawn(fail, "chat"):
+            return
+
+        content = self._content(request)
+        usage = self._usage(request, content)
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": request.get("model", "gpt-4.1")}
+        per_token = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        if not request.get("stream"):
+            time.sleep(per_token * usage["completion_tokens"])
+            self.server.count("chat:200")
+            self._send_json(200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ]})
+            return
+
+        self.server.count("chat:200:stream")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(content), 4):  # ~one token per 4 characters
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": content[i:i + 4]}, "finish_reason": None}
+            ]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(per_token)
+        final = {**base, "object": "chat.completion.chunk", "usage": usage, "choices": [
+            {"index": 0, "delta": {}, "finish_reason": "stop"}
+        ]}
+        self._write_chunk(f"data: {json.dumps(final)}\n\n".encode())
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeUpstream:
+    """A fake server running on a background thread; use as a context manager"""
+
+    def __init__(self, handler, profile):
+        self.server = _CountingServer(handler, profile)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def counts(self):
+        return self.server.snapshot()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_qloo(profile=None, entities_per_response=20):
+    handler = type("QlooHandler", (_QlooHandler,), {"entities_per_response": entities_per_response})
+    return FakeUpstream(handler, profile or UpstreamProfile())
+
+
+def fake_openai(profile=None, tokens_per_second=200.0):
+    handler = type("OpenAIHandler", (_OpenAIHandler,), {"tokens_per_second": tokens_per_second})
+    return FakeUpstream(handler, profile or UpstreamProfile(error_status=500))
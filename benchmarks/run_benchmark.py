@@ -0,0 +1,173 @@
+"""Offline load test of the full recommendation flow against local fake upstreams.
+
+Starts the fake Qloo and OpenAI servers, points a MoodFlowEngine at them and
+drives analyze -> Qloo -> summary at each concurrency level, then reports
+latency percentiles, throughput and how many upstream calls were made.
+
+    python -m benchmarks.run_benchmark --concurrency 1,8,32 --requests 200
+    python -m benchmarks.run_benchmark --output before.json
+    python -m benchmarks.run_benchmark --baseline before.json   # after a change
+
+Use ``--cache cold`` to make every request a cache miss (unique moods, Qloo
+TTL of zero) and measure the upstream path rather than the caches.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import OpenAI
+
+from benchmarks.fake_upstreams import LatencyModel, UpstreamProfile, fake_openai, fake_qloo
+from domains import PREFERENCE_OPTIONS
+from engine import EngineConfig, MoodFlowEngine
+from qloo_client import QlooClient
+
+MOODS = [
+    "I'm tired and need to unwind",
+    "feeling anxious about tomorrow",
+    "I'm celebrating but want to stay grounded",
+    "overwhelmed and need to slow down and breathe",
+    "bored and restless, want something exciting",
+    "I feel disconnected and want to feel understood",
+    "heartbroken after a breakup",
+    "motivated and ready to learn something new",
+]
+TIME_CONTEXTS = ["Morning", "Afternoon", "Evening", "Late Night"]
+
+
+def build_engine(qloo_url, openai_url, cache, streaming):
+    config = EngineConfig(streaming=streaming)
+    if cache == "cold":
+        config.qloo_cache_ttl = 0.0
+    return MoodFlowEngine(
+        None, None, config=config,
+        openai_client=OpenAI(api_key="bench", base_url=f"{openai_url}/v1", max_retries=0),
+        qloo_client=QlooClient("bench", base_url=f"{qloo_url}/v2/insights"),
+    )
+
+
+def workload(n, cache, seed):
+    """n (mood, time_context, preferences) requests, deterministic for a seed"""
+    rng = np.random.default_rng(seed)
+    requests = []
+    for i in range(n):
+        mood = MOODS[i % len(MOODS)]
+        if cache == "cold":
+            mood = f"{mood} (request {seed}-{i})"
+        k = int(rng.integers(1, len(PREFERENCE_OPTIONS) + 1))
+        preferences = sorted(rng.choice(PREFERENCE_OPTIONS, size=k, replace=False).tolist(), key=PREFERENCE_OPTIONS.index)
+        requests.append((mood, TIME_CONTEXTS[i % len(TIME_CONTEXTS)], preferences))
+    return requests
+
+
+def run_level(engine, requests, concurrency):
+    latencies = []
+    failures = Counter()
+    lock = threading.Lock()
+
+    def one(request):
+        start = time.perf_counter()
+        try:
+            result = engine.run(*request)
+            errors = result.errors
+        except Exception as e:
+            errors = [repr(e)]
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            for error in errors:
+                failures[error.split(":")[0]] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, requests))
+    wall = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "concurrency": concurrency,
+        "requests": len(requests),
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "mean_ms": round(float(np.mean(latencies)) * 1000, 1),
+        "throughput_rps": round(len(requests) / wall, 2),
+        "errors": dict(failures),
+    }
+
+
+def diff_counts(after, before):
+    return {key: after[key] - before.get(key, 0) for key in sorted(after) if after[key] - before.get(key, 0)}
+
+
+def print_report(levels, baseline=None):
+    base = {level["concurrency"]: level for level in (baseline or {}).get("levels", [])}
+    header = f"{'conc':>5} {'reqs':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}  upstream calls"
+    print(header)
+    print("-" * len(header))
+    for level in levels:
+        print(f"{level['concurrency']:>5} {level['requests']:>5} {level['p50_ms']:>9} {level['p95_ms']:>9} "
+              f"{level['p99_ms']:>9} {level['throughput_rps']:>8}  "
+              f"qloo={level['qloo_calls']} openai={level['openai_calls']}")
+        old = base.get(level["concurrency"])
+        if old:
+            deltas = "  ".join(
+                f"{key} {(level[key] - old[key]) / old[key] * 100:+.1f}%"
+                for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps") if old[key]
+            )
+            print(f"{'':>11} vs baseline: {deltas}")
+        if level["errors"]:
+            print(f"{'':>11} errors: {level['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per concurrency level")
+    parser.add_argument("--cache", choices=["warm", "cold"], default="warm")
+    parser.add_argument("--no-streaming", action="store_true", help="use blocking completions")
+    parser.add_argument("--qloo-latency", default="lognormal:0.25,0.4", type=LatencyModel.parse)
+    parser.add_argument("--qloo-error-rate", type=float, default=0.0)
+    parser.add_argument("--qloo-entities", type=int, default=20, help="entities per insights response")
+    parser.add_argument("--llm-latency", default="lognormal:0.6,0.3", type=LatencyModel.parse, help="time to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=120.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON (use as a later --baseline)")
+    parser.add_argument("--baseline", help="JSON from an earlier --output to compare against")
+    args = parser.parse_args(argv)
+
+    qloo_profile = UpstreamProfile(args.qloo_latency, args.qloo_error_rate, 503, args.seed)
+    openai_profile = UpstreamProfile(args.llm_latency, args.llm_error_rate, 500, args.seed)
+    baseline = json.load(open(args.baseline)) if args.baseline else None
+
+    with fake_qloo(qloo_profile, args.qloo_entities) as qloo, \
+            fake_openai(openai_profile, args.llm_tokens_per_second) as llm:
+        engine = build_engine(qloo.url, llm.url, args.cache, not args.no_streaming)
+        levels = []
+        for i, concurrency in enumerate(int(c) for c in args.concurrency.split(",")):
+            qloo_before, llm_before = qloo.counts(), llm.counts()
+            level = run_level(engine, workload(args.requests, args.cache, args.seed + i), concurrency)
+            level["qloo_calls"] = diff_counts(qloo.counts(), qloo_before)
+            level["openai_calls"] = diff_counts(llm.counts(), llm_before)
+            levels.append(level)
+        engine.close()
+
+    results = {
+        "config": {key: str(value) for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "levels": levels,
+    }
+    print_report(levels, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
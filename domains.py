@@ -0,0 +1,55 @@
+"""Registry of the content domains MoodFlow recommends from.
+
+Each domain ties together the name the model uses when picking a tag, the
+Qloo entity type it is fetched as, the sidebar option that selects it and how
+it is labelled on the page. Everything that used to match these up by string
+munging (``"travel ideas"`` vs ``"destination"``) goes through here instead.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Domain:
+    key: str                 # key under selected_tags / tag_reasoning in the analysis JSON
+    entity_type: str         # Qloo entity type, urn:entity:<entity_type>
+    preference: str          # sidebar multiselect option
+    title: str               # section header over the recommendation cards
+    metric_label: str        # label in the content profile row
+    emoji: str
+    tag_category: str        # key into the Qloo tag vocabulary
+    tag_label: str           # how the vocabulary is introduced in the prompt
+    tag_noun: str            # one tag from that vocabulary, for the reasoning prompt
+    fallback_tag: str
+    fallback_reasoning: str
+
+
+DOMAINS = (
+    Domain("movie", "movie", "Movies", "Movies & Shows", "Movies", "🎬",
+           "movie_genres", "Movie Genres", "movie genre",
+           "urn:tag:genre:media:drama", "Drama provides emotional depth and relatability"),
+    Domain("music", "artist", "Music", "Music Artists", "Music", "🎵",
+           "music_genres", "Music Genres", "music genre",
+           "urn:tag:genre:music:indie", "Indie music offers artistic authenticity and emotional nuance"),
+    Domain("book", "book", "Books", "Books", "Books", "📚",
+           "book_categories", "Book Categories", "book category",
+           "urn:tag:genre:media:fiction", "Fiction allows for emotional exploration and escapism"),
+    Domain("podcast", "podcast", "Podcasts", "Podcasts", "Podcasts", "🎧",
+           "podcast_types", "Podcast Types", "podcast type",
+           "urn:tag:genre:media:storytelling", "Storytelling provides narrative engagement"),
+    Domain("destination", "destination", "Travel Ideas", "Travel Destinations", "Travel", "✈️",
+           "destination_vibes", "Destination Vibes", "destination vibe",
+           "urn:tag:region:global:scenic", "Scenic locations offer peaceful reflection opportunities"),
+)
+
+DOMAINS_BY_KEY = {domain.key: domain for domain in DOMAINS}
+DOMAINS_BY_ENTITY_TYPE = {domain.entity_type: domain for domain in DOMAINS}
+DOMAINS_BY_PREFERENCE = {domain.preference: domain for domain in DOMAINS}
+PREFERENCE_OPTIONS = [domain.preference for domain in DOMAINS]
+
+
+def domains_for_preferences(activity_preferences):
+    """Domains the user selected, in registry order; no selection means all of them"""
+    if not activity_preferences:
+        return list(DOMAINS)
+    chosen = set(activity_preferences)
+    return [domain for domain in DOMAINS if domain.preference in chosen]
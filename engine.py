@@ -0,0 +1,652 @@
+"""Headless MoodFlow recommendation engine.
+
+Everything that turns a mood into recommendations lives here, with no
+Streamlit dependency: the Streamlit app and the HTTP endpoint in api.py are
+both thin clients. One engine per process holds the pooled clients and the
+process-wide caches.
+
+    engine = MoodFlowEngine.from_env()
+    result = await engine.recommend("I'm tired", "Evening", ["Movies", "Music"])
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass, field, replace
+from typing import Dict, List, Optional
+
+from openai import APIConnectionError, APITimeoutError, OpenAI
+
+import metrics
+import scheduler
+from archetypes import DEFAULT_MATCH_THRESHOLD, ArchetypeTable
+from domains import DOMAINS_BY_ENTITY_TYPE, DOMAINS_BY_KEY, domains_for_preferences
+from mood_analysis import analysis_response_format, default_reasoning, fallback_analysis, parse_analysis, parse_stats, record_fallback, streamed_tag
+from mood_cache import MoodAnalysisCache
+from pipeline import StageRunner, StageStream
+from qloo_client import QlooAPIError, QlooClient
+from rerank import analysis_tags, rank_entities
+from response_cache import ResponseCache
+from result_store import DEFAULT_TTL as RESULT_STORE_TTL, ResultStore, key_for
+from streaming import IncrementalJSONParser
+from tag_index import TAG_INDEX
+from warmer import DEFAULT_RATE, CacheWarmer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EngineConfig:
+    """Engine settings; ``from_env`` reads the MOODFLOW_* environment variables"""
+    model: str = "gpt-4.1"
+    # Seconds an OpenAI request may wait for a response (between chunks when streaming); the SDK's default is 600
+    openai_timeout: float = 30.0
+    # Stream completions so Qloo fetches start while the analysis is still generating
+    streaming: bool = True
+    # Share of the selected domains that must be in before the summary call starts
+    summary_quorum: float = 0.6
+    # Ask the LLM for the final summary; off, the local template summary is final (e.g. under load)
+    llm_summary: bool = True
+    results_per_domain: int = 4
+    qloo_cache_size: int = 512
+    qloo_cache_ttl: float = 21600.0
+    qloo_cache_db: Optional[str] = None
+    mood_cache_size: int = 2048
+    mood_cache_threshold: float = 0.85
+    # Precomputed archetype table (see archetypes.py); None leaves every new mood to the LLM
+    archetypes_path: Optional[str] = None
+    archetype_threshold: float = DEFAULT_MATCH_THRESHOLD
+    # Prefetch every Qloo (type, tag) pair in the background and refresh it before it expires
+    warmup: bool = False
+    warmup_rate: float = DEFAULT_RATE
+    warmup_top_n: int = 0
+    # Where results live between reruns and replicas (see result_store.py); None keeps them in this process
+    result_store: Optional[str] = None
+    result_store_ttl: float = RESULT_STORE_TTL
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(
+            model=env("MOODFLOW_MODEL", cls.model),
+            openai_timeout=float(env("MOODFLOW_OPENAI_TIMEOUT", cls.openai_timeout)),
+            streaming=env("MOODFLOW_STREAMING", "1") != "0",
+            summary_quorum=float(env("MOODFLOW_SUMMARY_QUORUM", cls.summary_quorum)),
+            llm_summary=env("MOODFLOW_LLM_SUMMARY", "1") != "0",
+            qloo_cache_size=int(env("MOODFLOW_QLOO_CACHE_SIZE", cls.qloo_cache_size)),
+            qloo_cache_ttl=float(env("MOODFLOW_QLOO_CACHE_TTL", cls.qloo_cache_ttl)),
+            qloo_cache_db=env("MOODFLOW_QLOO_CACHE_DB") or None,
+            mood_cache_size=int(env("MOODFLOW_MOOD_CACHE_SIZE", cls.mood_cache_size)),
+            mood_cache_threshold=float(env("MOODFLOW_MOOD_CACHE_THRESHOLD", cls.mood_cache_threshold)),
+            archetypes_path=env("MOODFLOW_ARCHETYPES") or None,
+            archetype_threshold=float(env("MOODFLOW_ARCHETYPE_THRESHOLD", cls.archetype_threshold)),
+            warmup=env("MOODFLOW_WARMUP", "0") == "1",
+            warmup_rate=float(env("MOODFLOW_WARMUP_RATE", cls.warmup_rate)),
+            warmup_top_n=int(env("MOODFLOW_WARMUP_TOP_N", cls.warmup_top_n)),
+            result_store=env("MOODFLOW_RESULT_STORE") or None,
+            result_store_ttl=float(env("MOODFLOW_RESULT_STORE_TTL", cls.result_store_ttl)),
+        )
+
+
+@dataclass
+class RecommendationResult:
+    """Everything one recommendation run produced"""
+    mood: str
+    time_context: str
+    preferences: List[str]
+    analysis: dict
+    recommendations: Dict[str, List[dict]]  # Qloo entity type -> the entities to show
+    summary: str
+    errors: List[str] = field(default_factory=list)
+    timings: List[dict] = field(default_factory=list)
+    critical_path: List[str] = field(default_factory=list)
+    # Every entity Qloo returned per type, for local "more like this" (see rerank.py)
+    candidates: Dict[str, List[dict]] = field(default_factory=dict)
+    # With run(defer_summary=True): the LLM summary as it generates; ``summary`` is the template until it's done
+    pending_summary: Optional[StageStream] = field(default=None, repr=False, compare=False)
+
+    def to_dict(self):
+        data = asdict(replace(self, pending_summary=None))
+        del data["pending_summary"]
+        return data
+
+
+class PipelineListener:
+    """Progress callbacks for a run, all invoked on the thread that called ``run``.
+
+    The default implementation ignores everything; the Streamlit app
+    overrides these to render each piece as soon as it exists.
+    """
+
+    def on_interpretation(self, text):
+        pass
+
+    def on_fetch_started(self, entity_type):
+        pass
+
+    def on_fetch_finished(self, entity_type, items, error):
+        pass
+
+    def on_error(self, message):
+        pass
+
+    def consume_summary(self, chunks):
+        """Drain the summary as it streams in and return the full text"""
+        return "".join(chunks)
+
+
+def fallback_summary(mood):
+    return f"Your personalized content collection has been carefully curated to support your current emotional journey: {mood}. Each recommendation works together to provide exactly what you need right now. Trust the process and enjoy this thoughtfully designed experience!"
+
+
+def template_summary(mood, mood_analysis, recommendations):
+    """A summary assembled locally from the analysis and the top pick per domain, with no LLM call.
+
+    Shown while the LLM summary is generating, and instead of it when that is
+    turned off or fails.
+    """
+    def sentence(text):
+        text = (text or "").strip()
+        return text if not text or text[-1] in ".!?" else text + "."
+
+    parts = [sentence(mood_analysis.get("mood_interpretation"))]
+    needs = (mood_analysis.get("psychological_needs") or "").strip().rstrip(".")
+    if needs:
+        parts.append(f"What would help most right now: {needs[0].lower()}{needs[1:]}.")
+    picks = []
+    for entity_type, items in recommendations.items():
+        if items:
+            domain = DOMAINS_BY_ENTITY_TYPE.get(entity_type)
+            picks.append(f"{items[0].get('name') or 'Unknown'} ({domain.metric_label if domain else entity_type})")
+    if picks:
+        listed = picks[0] if len(picks) == 1 else ", ".join(picks[:-1]) + f" and {picks[-1]}"
+        parts.append(f"Start with {listed}.")
+    parts.append(sentence(mood_analysis.get("overall_strategy")))
+    return " ".join(part for part in parts if part) or fallback_summary(mood)
+
+
+def build_analysis_request(mood_description, time_context, activity_preferences, model):
+    """Chat-completion arguments for the mood analysis of one mood.
+
+    Only the domains the user picked go into the prompt and the requested JSON.
+    """
+    domains = domains_for_preferences(activity_preferences)
+    activity_list = ", ".join(activity_preferences) if activity_preferences else "all content types"
+    tag_lists = "\n            ".join(
+        f"{domain.tag_label}: {TAG_INDEX.prompt_listing(domain.tag_category)}" for domain in domains
+    )
+    selected_tag_fields = ",\n                    ".join(
+        f'"{domain.key}": ID of the {domain.tag_noun} that best matches their emotional needs'
+        for domain in domains
+    )
+    reasoning_fields = ",\n                    ".join(
+        f'"{domain.key}": "Why this {domain.tag_noun} specifically matches their mood and psychological needs"'
+        for domain in domains
+    )
+
+    prompt = f"""
+            MOOD TO ANALYZE: "{mood_description}"
+            TIME CONTEXT: {time_context}
+            USER INTERESTS: {activity_list}
+
+            You are an expert mood analyst and content curator. Your job is to:
+            1. Deeply analyze this person's emotional state and needs
+            2. Select the MOST appropriate Qloo API tags from the available options
+            3. Provide reasoning for your selections
+
+            AVAILABLE QLOO TAGS (ID=tag):
+            {tag_lists}
+
+            Based on the mood analysis, provide a JSON response with this structure:
+            {{
+                "mood_interpretation": "Empathetic interpretation of their emotional state and what they might need",
+                "energy_level": "low/medium/high",
+                "emotional_tone": "positive/negative/neutral/mixed/complex",
+                "psychological_needs": "What this person psychologically needs right now (comfort, stimulation, escape, reflection, etc.)",
+                "selected_tags": {{
+                    {selected_tag_fields}
+                }},
+                "tag_reasoning": {{
+                    {reasoning_fields}
+                }},
+                "overall_strategy": "Brief explanation of the overall content strategy for this mood"
+            }}
+
+            IMPORTANT RULES:
+            - Select tags that will genuinely help this person's current emotional state
+            - Consider what they need psychologically (comfort vs stimulation, escapism vs reflection, etc.)
+            - Answer each selected tag with its numeric ID from that content type's list
+            - Be specific and thoughtful in your reasoning
+            - Consider how different content types work together to create a cohesive mood experience
+            - Time context should influence selections (morning = energizing, evening = calming, etc.)
+    """
+
+    return {
+        "messages": [
+            {"role": "system", "content": "You are an expert psychologist and content curator who understands how different media affects human emotions and psychological states. You select content that genuinely helps people based on their current emotional needs."},
+            {"role": "user", "content": prompt}
+        ],
+        "model": model,
+        "max_tokens": 200 + 120 * len(domains),  # 800 with all five domains
+        "temperature": 0.7,
+        "response_format": analysis_response_format(domains),
+    }
+
+
+def build_summary_request(mood, mood_analysis, recommendations, model):
+    """Chat-completion arguments asking the model for the personalized final summary"""
+    rec_summary = []
+    for category, items in recommendations.items():
+        if items:
+            rec_summary.append(f"{category.title()}: {', '.join([item.get('name', 'Unknown') for item in items[:2]])}")
+
+    prompt = f"""
+    USER'S ORIGINAL MOOD: "{mood}"
+    AI MOOD INTERPRETATION: {mood_analysis.get('mood_interpretation', '')}
+    PSYCHOLOGICAL NEEDS IDENTIFIED: {mood_analysis.get('psychological_needs', '')}
+    OVERALL CONTENT STRATEGY: {mood_analysis.get('overall_strategy', '')}
+    ACTUAL RECOMMENDATIONS FOUND: {'; '.join(rec_summary)}
+
+    Create a warm, personalized, and psychologically insightful 3-4 sentence summary that:
+    1. Acknowledges their specific emotional state with empathy
+    2. Explains how this curated collection addresses their psychological needs
+    3. Describes how the different content types work synergistically
+    4. Provides encouraging words for their journey
+
+    Make it feel like advice from a caring friend who truly understands their emotional state.
+    """
+
+    return {
+        "messages": [
+            {"role": "system", "content": "You are a compassionate lifestyle coach and emotional intelligence expert who creates deeply personalized, psychologically aware summaries that make people feel understood and cared for."},
+            {"role": "user", "content": prompt}
+        ],
+        "model": model,
+        "max_tokens": 200,
+        "temperature": 0.8,
+    }
+
+
+class MoodFlowEngine:
+    """Mood -> analysis -> Qloo -> summary, with shared clients and caches"""
+
+    def __init__(self, openai_api_key, qloo_api_key, config=None, openai_client=None, qloo_client=None):
+        self.config = config or EngineConfig.from_env()
+        # Retries are the scheduler's job, so a 429 slows every caller down instead of each retrying alone
+        self.client = openai_client or OpenAI(api_key=openai_api_key, max_retries=0, timeout=self.config.openai_timeout)
+        self.openai_scheduler = scheduler.for_upstream(
+            "openai", retryable=lambda e: isinstance(e, (APIConnectionError, APITimeoutError))
+        )
+        self.qloo_client = qloo_client or QlooClient(qloo_api_key)
+        self.qloo_cache = ResponseCache(
+            max_entries=self.config.qloo_cache_size,
+            ttl=self.config.qloo_cache_ttl,
+            disk_path=self.config.qloo_cache_db,
+        )
+        self.mood_cache = MoodAnalysisCache(
+            capacity=self.config.mood_cache_size,
+            threshold=self.config.mood_cache_threshold,
+        )
+        self.archetypes = None
+        if self.config.archetypes_path:
+            self.archetypes = ArchetypeTable.load(self.config.archetypes_path, self.config.archetype_threshold)
+            metrics.REGISTRY.register_collector("archetypes", self.archetypes.stats)
+        self.store = ResultStore.from_url(self.config.result_store, self.config.result_store_ttl)
+        metrics.REGISTRY.register_collector("result_store", self.store.stats)
+        self._qloo_popularity = Counter()
+        self._popularity_lock = threading.Lock()
+        # Cache and parser counters show up as gauges on /metrics and the admin page
+        metrics.REGISTRY.register_collector("qloo_cache", self.qloo_cache.stats)
+        metrics.REGISTRY.register_collector("mood_cache", self.mood_cache.stats)
+        metrics.REGISTRY.register_collector("analysis_parse", parse_stats)
+        self.warmer = None
+        if self.config.warmup:
+            self.warmer = CacheWarmer(self, self.config.warmup_rate, self.config.warmup_top_n).start()
+            metrics.REGISTRY.register_collector("warmup", self.warmer.progress)
+
+    @classmethod
+    def from_env(cls, config=None):
+        """Build an engine from the OPENAI_KEY and QLOO_KEY environment variables"""
+        missing = [name for name in ("OPENAI_KEY", "QLOO_KEY") if not os.environ.get(name)]
+        if missing:
+            raise RuntimeError(f"Missing environment variables: {', '.join(missing)}")
+        return cls(os.environ["OPENAI_KEY"], os.environ["QLOO_KEY"], config=config)
+
+    def _create_completion(self, call, **kwargs):
+        """chat.completions.create, timed (to the first byte when streaming) and counted by status"""
+        if kwargs.get("stream"):
+            kwargs["stream_options"] = {"include_usage": True}
+
+        def create():
+            with metrics.upstream_call("openai", call) as span:
+                response = self.client.chat.completions.create(**kwargs)
+                span.labels["status"] = 200
+            return response
+
+        response = self.openai_scheduler.call(create)
+        if not kwargs.get("stream"):
+            metrics.record_tokens(call, getattr(response, "usage", None))
+        return response
+
+    def analyze_mood_and_generate_dynamic_tags(self, mood_description, time_context="", activity_preferences=None, on_field=None, on_error=None):
+        """Use OpenAI to analyze mood and dynamically select the best Qloo tags.
+
+        When ``on_field`` is given the completion is streamed and parsed as it
+        arrives, and ``on_field(path, value)`` is called for each JSON field as soon
+        as it is complete, e.g. ``(("mood_interpretation",), "...")``.
+        """
+        cached = self.mood_cache.get(mood_description, time_context, activity_preferences)
+        if cached is not None:
+            return cached
+        # A confident archetype match answers locally in well under a millisecond
+        if self.archetypes is not None:
+            analysis = self.archetypes.analysis_for(mood_description, time_context, activity_preferences)
+            if analysis is not None:
+                return analysis
+        # Another replica may already have analysed this exact mood
+        shared_key = key_for("analysis", mood_description, time_context, sorted(activity_preferences or []))
+        if self.store.shared:
+            shared = self.store.lookup(shared_key)
+            if shared is not None:
+                self.mood_cache.put(mood_description, time_context, activity_preferences, shared)
+                return shared
+
+        # Only the domains the user picked go into the prompt and the requested JSON
+        domains = domains_for_preferences(activity_preferences)
+        received = []
+
+        try:
+            response = self._create_completion(
+                "analysis",
+                **build_analysis_request(mood_description, time_context, activity_preferences, self.config.model),
+                stream=on_field is not None
+            )
+
+            # Parse the JSON response; a malformed completion is repaired field by field, not discarded
+            if on_field is None:
+                content = response.choices[0].message.content or ""
+            else:
+                parser = IncrementalJSONParser()
+                previewing = True
+                for chunk in response:
+                    if getattr(chunk, "usage", None):
+                        metrics.record_tokens("analysis", chunk.usage)
+                    if not (chunk.choices and chunk.choices[0].delta.content):
+                        continue
+                    received.append(chunk.choices[0].delta.content)
+                    try:
+                        fields = parser.feed(received[-1]) if previewing else []
+                    except (ValueError, IndexError):
+                        fields = []  # Stop previewing; the full text is still parsed below
+                        previewing = False
+                    for path, value in fields:
+                        if path[0] == "selected_tags":
+                            # Callers see URNs, never IDs; invalid IDs are repaired after the stream ends
+                            value = streamed_tag(path, value)
+                            if value is None:
+                                continue
+                        on_field(path, value)
+                content = "".join(received)
+
+            analysis, clean = parse_analysis(content, mood_description, domains)
+            if clean:
+                self.mood_cache.put(mood_description, time_context, activity_preferences, analysis)
+                if self.store.shared:
+                    self.store.put("analysis", analysis, key=shared_key)
+            return analysis
+
+        except Exception as e:
+            logger.warning("Mood analysis failed: %s", e)
+            if on_error is not None:
+                on_error(f"Error in dynamic mood analysis: {e}")
+            if received:
+                # The stream broke off: keep the fields it delivered, which the user may already
+                # have seen and Qloo fetches started from, and repair only the rest
+                analysis, _ = parse_analysis("".join(received), mood_description, domains)
+                return analysis
+            # Fallback to safe defaults
+            record_fallback()
+            return fallback_analysis(mood_description, domains)
+
+    def get_qloo_recommendations(self, domain_type, tag):
+        """Fetch a page of candidate entities from the Qloo API, in Qloo's order.
+
+        Raises on failure. The query depends only on (type, tag), so results are
+        shared through the process-wide cache and concurrent misses for the same
+        pair make a single upstream call.
+        """
+        with self._popularity_lock:
+            self._qloo_popularity[(domain_type, tag)] += 1
+        # A warm-up fetch of the same pair may be queued; this request shouldn't wait in its lane
+        self.qloo_client.prioritize(domain_type, tag)
+        return self.load_qloo_recommendations(domain_type, tag)
+
+    def load_qloo_recommendations(self, domain_type, tag):
+        """Cached lookup without counting towards popularity, for background warm-up"""
+        return self.qloo_cache.get_or_load((domain_type, tag), lambda: self._fetch_qloo(domain_type, tag))
+
+    def _fetch_qloo(self, domain_type, tag, use_shared=True):
+        """Qloo's page for one pair, from the shared store when another replica fetched it recently"""
+        if not self.store.shared or self.config.qloo_cache_ttl <= 0:
+            return self.qloo_client.insights(domain_type, tag)
+        key = key_for("qloo", domain_type, tag)
+        value = self.store.lookup(key) if use_shared else None
+        if value is None:
+            value = self.qloo_client.insights(domain_type, tag)
+            self.store.put("qloo", value, key=key, ttl=self.config.qloo_cache_ttl)
+        return value
+
+    def refresh_qloo_recommendations(self, domain_type, tag):
+        """Re-fetch one (type, tag) pair into the cache even if it hasn't expired yet"""
+        value = self._fetch_qloo(domain_type, tag, use_shared=False)
+        self.qloo_cache.set((domain_type, tag), value)
+        return value
+
+    def qloo_popularity(self):
+        """How often each (type, tag) pair was asked for since the engine started"""
+        with self._popularity_lock:
+            return dict(self._qloo_popularity)
+
+    def generate_final_summary(self, mood, mood_analysis, recommendations):
+        """Generate a personalized final summary based on AI analysis"""
+        if not self.config.llm_summary:
+            return template_summary(mood, mood_analysis, recommendations)
+        try:
+            response = self._create_completion(
+                "summary",
+                **build_summary_request(mood, mood_analysis, recommendations, self.config.model)
+            )
+
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.warning("Summary generation failed: %s", e)
+            return template_summary(mood, mood_analysis, recommendations)
+
+    def _final_summary_chunks(self, mood, mood_analysis, recommendations):
+        """The blocking summary as a one-chunk stream, for readers that take it as one"""
+        yield self.generate_final_summary(mood, mood_analysis, recommendations)
+
+    def stream_final_summary(self, mood, mood_analysis, recommendations):
+        """Yield the final summary token by token"""
+        streamed_any = False
+        try:
+            response = self._create_completion(
+                "summary",
+                **build_summary_request(mood, mood_analysis, recommendations, self.config.model),
+                stream=True
+            )
+            for chunk in response:
+                if getattr(chunk, "usage", None):
+                    metrics.record_tokens("summary", chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    streamed_any = True
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.warning("Summary stream failed: %s", e)
+            # Keep whatever already reached the user; only fall back if nothing did
+            if not streamed_any:
+                yield template_summary(mood, mood_analysis, recommendations)
+
+    def run(self, mood, time_context="", preferences=None, additional_context="", listener=None, defer_summary=False):
+        """Analysis -> Qloo -> summary, overlapped instead of run in strict phases.
+
+        Each Qloo fetch starts the moment its tag is parsed out of the streamed
+        analysis, and the summary starts once ``summary_quorum`` of the domains
+        are in. ``listener`` is told about each piece as it lands, on this thread.
+        With ``defer_summary`` the run returns as soon as the recommendations are
+        in, with the template summary, and the LLM summary carries on generating
+        in the background into the ``pending_summary`` StageStream.
+        """
+        with metrics.trace(), metrics.span("request", histogram=metrics.REQUEST_SECONDS):
+            return self._run(mood, time_context, preferences, additional_context, listener, defer_summary)
+
+    def _run(self, mood, time_context, preferences, additional_context, listener, defer_summary):
+        listener = listener or PipelineListener()
+        preferences = list(preferences or [])
+        full_mood_description = mood
+        if additional_context:
+            full_mood_description += f" Additional context: {additional_context}"
+
+        runner = StageRunner()
+        expected = {domain.key: domain.entity_type for domain in domains_for_preferences(preferences)}
+        quorum = max(1, math.ceil(self.config.summary_quorum * len(expected)))
+        started = []
+        recommendations = {}
+        candidates = {}
+        selected_tags = {}
+        # The analysis's full tag set once it is known; until then, the tags parsed so far
+        ranking = {}
+        errors = []
+        summary = {}
+
+        def report_error(message):
+            errors.append(message)
+            listener.on_error(message)
+
+        def fetch_stages():
+            return [f"qloo:{entity_type}" for entity_type in started]
+
+        def start_fetch(content_type, tag):
+            entity_type = expected.get(content_type)
+            if entity_type and entity_type not in started:
+                selected_tags[content_type] = tag
+                started.append(entity_type)
+                listener.on_fetch_started(entity_type)
+                runner.submit(f"qloo:{entity_type}", self.get_qloo_recommendations, entity_type, tag, after=("analysis",))
+
+        def rank(entity_type):
+            tags = ranking.get("tags", selected_tags.values())
+            return rank_entities(candidates[entity_type], tags)[:self.config.results_per_domain]
+
+        def finish_fetch(outcome):
+            entity_type = outcome.key.split(":", 1)[1]
+            candidates[entity_type] = outcome.value if outcome.ok else []
+            recommendations[entity_type] = rank(entity_type)
+            error = None
+            if isinstance(outcome.error, QlooAPIError):
+                error = str(outcome.error)
+            elif not outcome.ok:
+                error = f"Error fetching {entity_type} from Qloo: {outcome.error}"
+            if error:
+                report_error(error)
+            listener.on_fetch_finished(entity_type, recommendations[entity_type], error)
+
+        def maybe_start_summary(mood_analysis, force=False):
+            if not self.config.llm_summary or summary or not (force or len(recommendations) >= quorum):
+                return
+            after = ("analysis",) + tuple(f"qloo:{entity_type}" for entity_type in recommendations)
+            args = (mood, mood_analysis, dict(recommendations))
+            # On the LLM pool, so other sessions' Qloo fetches don't queue behind a multi-second completion
+            if self.config.streaming:
+                summary["stream"] = runner.submit_stream("summary", self.stream_final_summary, *args, after=after, pool="llm")
+            elif defer_summary:
+                summary["stream"] = runner.submit_stream("summary", self._final_summary_chunks, *args, after=after, pool="llm")
+            else:
+                summary["future"] = runner.submit("summary", self.generate_final_summary, *args, after=after, pool="llm")
+                summary["stream"] = None
+
+        def on_field(path, value):
+            if path == ("mood_interpretation",):
+                listener.on_interpretation(value)
+            elif len(path) == 2 and path[0] == "selected_tags":
+                start_fetch(path[1], value)
+            for outcome in runner.ready(fetch_stages()):
+                finish_fetch(outcome)
+
+        # Step 1: AI mood analysis; with streaming on, Qloo fetches start from inside it
+        mood_analysis = runner.run(
+            "analysis", self.analyze_mood_and_generate_dynamic_tags,
+            full_mood_description, time_context, preferences,
+            on_field=on_field if self.config.streaming else None,
+            on_error=report_error
+        )
+
+        # The cards come from the tags the stream started fetching; when the final analysis
+        # ended up with a different one (e.g. repaired after the stream broke), report the
+        # tag that was actually fetched rather than one nothing was fetched for
+        final_tags = mood_analysis.get("selected_tags", {})
+        fetched = {content_type: tag for content_type, tag in selected_tags.items() if final_tags.get(content_type) != tag}
+        if fetched:
+            mood_analysis = {
+                **mood_analysis,
+                "selected_tags": {**final_tags, **fetched},
+                "tag_reasoning": {
+                    **mood_analysis.get("tag_reasoning", {}),
+                    **{content_type: default_reasoning(DOMAINS_BY_KEY[content_type], tag) for content_type, tag in fetched.items()},
+                },
+            }
+
+        # Re-rank what came in while the analysis streamed with its final tags, the same
+        # order "more like this" pages through (rerank.page with analysis_tags)
+        ranking["tags"] = analysis_tags(mood_analysis)
+        for entity_type in recommendations:
+            recommendations[entity_type] = rank(entity_type)
+
+        # Step 2: Any domain the stream didn't start (no streaming, cache hit, fallback tags)
+        for content_type, tag in mood_analysis.get('selected_tags', {}).items():
+            start_fetch(content_type, tag)
+        maybe_start_summary(mood_analysis)
+        for outcome in runner.completed(fetch_stages()):
+            finish_fetch(outcome)
+            maybe_start_summary(mood_analysis)
+
+        # Step 3: Final summary, usually already generating by now
+        maybe_start_summary(mood_analysis, force=True)
+        shown = {entity_type: recommendations.get(entity_type, []) for entity_type in started}
+        local_summary = template_summary(mood, mood_analysis, shown)
+        pending_summary = None
+        if not self.config.llm_summary:
+            final_summary = local_summary
+        elif defer_summary:
+            final_summary = local_summary
+            pending_summary = summary["stream"]
+        elif summary["stream"] is not None:
+            final_summary = listener.consume_summary(summary["stream"]) or local_summary
+        else:
+            outcome = next(runner.completed(["summary"]))
+            final_summary = outcome.value if outcome.ok else local_summary
+
+        return RecommendationResult(
+            mood=mood,
+            time_context=time_context,
+            preferences=preferences,
+            analysis=mood_analysis,
+            recommendations=shown,
+            candidates={entity_type: candidates.get(entity_type, []) for entity_type in started},
+            summary=final_summary,
+            errors=errors,
+            timings=runner.report(),
+            critical_path=runner.critical_path(),
+            pending_summary=pending_summary,
+        )
+
+    async def recommend(self, mood, time_context="", preferences=None, additional_context=""):
+        """Async entry point for servers; the blocking pipeline runs on a worker thread"""
+        return await asyncio.to_thread(self.run, mood, time_context, preferences, additional_context)
+
+    def close(self):
+        if self.warmer is not None:
+            self.warmer.stop()
+        self.qloo_client.close()
@@ -0,0 +1,43 @@
+"""Shared worker pools for the pipeline's background stages."""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# Process-wide cap on Qloo calls in flight, shared by every Streamlit session; matches the Qloo connection pool
+MAX_WORKERS = int(os.environ.get("MOODFLOW_FANOUT_WORKERS", "16"))
+# LLM completions take seconds, so they get their own workers and Qloo fetches never queue behind them
+LLM_WORKERS = int(os.environ.get("MOODFLOW_LLM_WORKERS", "16"))
+# Seconds a single request may run before its result is abandoned
+DEFAULT_TIMEOUT = float(os.environ.get("MOODFLOW_FANOUT_TIMEOUT", "15"))
+
+_POOL_SIZES = {"fanout": MAX_WORKERS, "llm": LLM_WORKERS}
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class FetchOutcome:
+    """Result of one background stage: either a value or the error it raised"""
+    key: str
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def get_executor(pool="fanout"):
+    """Return the shared ``pool`` ("fanout" for Qloo, "llm" for completions), creating it on first use"""
+    executor = _executors.get(pool)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(pool)
+            if executor is None:
+                executor = _executors[pool] = ThreadPoolExecutor(
+                    max_workers=_POOL_SIZES[pool], thread_name_prefix=f"moodflow-{pool}"
+                )
+    return executor
@@ -0,0 +1,293 @@
+"""In-process instrumentation: timing spans, counters and histograms.
+
+Metrics are exported in the Prometheus text format (GET /metrics on the API,
+or a small exporter thread for the Streamlit app when MOODFLOW_METRICS_PORT
+is set). Each histogram series also keeps a window of recent samples for the
+live percentiles on the admin page. When MOODFLOW_TRACE_FILE is set, every
+finished span is appended to it as one JSON line, tagged with the trace ID of
+the request it belongs to.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SAMPLES = 1024
+
+_trace_id = contextvars.ContextVar("moodflow_trace_id", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{v}"'.replace("\n", " ") for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def series(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {value}" for key, value in sorted(self.series().items())]
+        return lines
+
+
+class _HistogramSeries:
+    def __init__(self, buckets):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series.bucket_counts[i] += 1
+            series.count += 1
+            series.sum += value
+            series.recent.append(value)
+
+    def summary(self):
+        """Count, mean and recent p50/p95/p99 per label set, for dashboards"""
+        with self._lock:
+            items = [(key, s.count, s.sum, list(s.recent)) for key, s in self._series.items()]
+        rows = []
+        for key, count, total, recent in sorted(items):
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if recent else (0.0, 0.0, 0.0)
+            rows.append({
+                "metric": self.name, **dict(key), "count": count, "mean_ms": round(total / count * 1000, 1),
+                "p50_ms": round(float(p50) * 1000, 1), "p95_ms": round(float(p95) * 1000, 1), "p99_ms": round(float(p99) * 1000, 1),
+            })
+        return rows
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(s.bucket_counts), s.count, s.sum) for key, s in self._series.items())
+        for key, bucket_counts, count, total in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, plus named collectors that report gauges on demand"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help):
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name, collect):
+        """``collect()`` returns {gauge_name: value}; re-registering a name replaces it"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def gauges(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+        values = {}
+        for prefix, collect in collectors:
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    # Flags such as the warmer's ``ready`` export as 0/1
+                    values[f"moodflow_{prefix}_{key}".replace(":", "_").replace(".", "_")] = int(value) if isinstance(value, bool) else value
+        return values
+
+    def render_prometheus(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for name, value in sorted(self.gauges().items()):
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def histograms(self):
+        return [metric for metric in self._metrics if isinstance(metric, Histogram)]
+
+    def counters(self):
+        return [metric for metric in self._metrics if isinstance(metric, Counter)]
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram("moodflow_request_seconds", "End-to-end recommendation run time")
+STAGE_SECONDS = REGISTRY.histogram("moodflow_stage_seconds", "Pipeline stage run time")
+UPSTREAM_SECONDS = REGISTRY.histogram("moodflow_upstream_request_seconds", "Upstream call time, by upstream, call and status")
+UPSTREAM_REQUESTS = REGISTRY.counter("moodflow_upstream_requests_total", "Upstream calls, by upstream, call and status")
+LLM_TOKENS = REGISTRY.counter("moodflow_llm_tokens_total", "OpenAI tokens used, by call and kind")
+
+
+class _TraceWriter:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+_trace_writer = _TraceWriter(os.environ["MOODFLOW_TRACE_FILE"]) if os.environ.get("MOODFLOW_TRACE_FILE") else None
+
+
+def set_trace_file(path):
+    """Start (or with None, stop) appending finished spans to a JSONL file"""
+    global _trace_writer
+    _trace_writer = _TraceWriter(path) if path else None
+
+
+@contextmanager
+def trace():
+    """Give everything inside (and any context copied from it) one trace ID"""
+    token = _trace_id.set(uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+class Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.duration = None
+
+
+@contextmanager
+def span(name, histogram=STAGE_SECONDS, **labels):
+    """Time a block into ``histogram``; labels may be added on the yielded span before it ends"""
+    current = Span(name, dict(labels))
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield current
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        if failed:
+            current.labels.setdefault("status", "error")
+        histogram.observe(current.duration, **current.labels)
+        if _trace_writer is not None:
+            _trace_writer.write({
+                "ts": time.time(), "trace_id": _trace_id.get(), "span": name,
+                "duration_ms": round(current.duration * 1000, 3), **current.labels,
+            })
+
+
+@contextmanager
+def upstream_call(upstream, call):
+    """Time and count one upstream request; set ``status`` on the yielded span once it is known.
+
+    A failure without a status of its own is labelled with its exception's
+    ``status_code`` (Qloo and OpenAI errors carry one) or its class name.
+    """
+    with span(upstream, histogram=UPSTREAM_SECONDS, upstream=upstream, call=call) as current:
+        try:
+            yield current
+        except Exception as e:
+            current.labels.setdefault("status", getattr(e, "status_code", None) or type(e).__name__)
+            raise
+        finally:
+            current.labels.setdefault("status", "unknown")
+            UPSTREAM_REQUESTS.inc(**current.labels)
+
+
+def record_tokens(call, usage):
+    """Count prompt/completion tokens from an OpenAI ``usage`` object (may be None)"""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, call=call, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, call=call, kind="completion")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", REGISTRY.render_prometheus().encode("utf-8"))
+        elif path == "/readyz":
+            progress = self.server.readiness() if self.server.readiness is not None else {"ready": True}
+            self._send(200 if progress["ready"] else 503, "application/json", json.dumps(progress, default=str).encode("utf-8"))
+        else:
+            self.send_error(404)
+
+
+def serve(port, host="0.0.0.0", readiness=None):
+    """Expose /metrics and /readyz on a background thread, for processes without their own HTTP server.
+
+    ``readiness()`` returns a dict whose ``ready`` flag decides between 200
+    and 503 on /readyz, like api.py's; without it the process is always ready.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.readiness = readiness
+    threading.Thread(target=server.serve_forever, name="moodflow-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,236 @@
+"""The mood-analysis contract: its strict JSON schema, a tolerant parser and per-field repair.
+
+The completion is requested in structured-output mode, so it normally parses
+on the first try. When it doesn't (a markdown fence, trailing prose, a
+completion cut off at max_tokens) we still keep every field that did come
+through and repair only the broken ones, instead of discarding a paid-for
+generation. Process-wide counters record which path each parse took.
+"""
+import json
+import threading
+from collections import Counter
+
+from domains import DOMAINS_BY_KEY
+from streaming import IncrementalJSONParser
+from tag_index import TAG_INDEX, tag_label
+
+ENERGY_LEVELS = ("low", "medium", "high")
+EMOTIONAL_TONES = ("positive", "negative", "neutral", "mixed", "complex")
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(*keys):
+    with _stats_lock:
+        _stats.update(keys)
+
+
+def parse_stats():
+    """How often each parse path was taken and each field repaired, since process start"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def analysis_response_format(domains):
+    """Strict JSON schema for the mood analysis; each tag must be an ID from its domain's category"""
+    text = {"type": "string"}
+    per_domain = lambda value_schema: {
+        "type": "object",
+        "properties": {domain.key: value_schema(domain) for domain in domains},
+        "required": [domain.key for domain in domains],
+        "additionalProperties": False
+    }
+    # Properties are generated in this order, so the interpretation streams first
+    properties = {
+        "mood_interpretation": text,
+        "energy_level": {"type": "string", "enum": list(ENERGY_LEVELS)},
+        "emotional_tone": {"type": "string", "enum": list(EMOTIONAL_TONES)},
+        "psychological_needs": text,
+        "selected_tags": per_domain(lambda domain: {"type": "integer", "enum": TAG_INDEX.ids(domain.tag_category)}),
+        "tag_reasoning": per_domain(lambda domain: text),
+        "overall_strategy": text
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "mood_analysis",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+def streamed_tag(path, value):
+    """URN for a ('selected_tags', key) field parsed out of the stream, or None if it isn't a valid tag"""
+    if len(path) != 2 or path[0] != "selected_tags" or path[1] not in DOMAINS_BY_KEY:
+        return None
+    return TAG_INDEX.resolve(DOMAINS_BY_KEY[path[1]].tag_category, value)
+
+
+def extract_json(text):
+    """Pull the analysis object out of raw completion text.
+
+    Returns ``(obj, path)`` where path is "strict" (the text was plain JSON),
+    "extracted" (a complete object wrapped in fences or prose) or "partial"
+    (only the fields that finished before the text was cut off). Raises
+    ValueError when nothing usable is found.
+    """
+    try:
+        obj = json.loads(text)
+        if isinstance(obj, dict):
+            return obj, "strict"
+    except ValueError:
+        pass
+
+    parser = IncrementalJSONParser()
+    try:
+        parser.feed(text)
+        if parser.complete:
+            return parser.result(), "extracted"
+    except (ValueError, IndexError):
+        pass
+    partial = parser.partial_result()
+    if partial:
+        return partial, "partial"
+    raise ValueError("no JSON object in completion")
+
+
+def fallback_analysis(mood_description, domains):
+    """Safe defaults used when the model gave us nothing usable"""
+    return {
+        "mood_interpretation": f"Understanding your current state: {mood_description}",
+        "energy_level": "medium",
+        "emotional_tone": "mixed",
+        "psychological_needs": "balance and comfort",
+        "selected_tags": {domain.key: domain.fallback_tag for domain in domains},
+        "tag_reasoning": {domain.key: domain.fallback_reasoning for domain in domains},
+        "overall_strategy": "Providing balanced content for emotional equilibrium and gentle engagement."
+    }
+
+
+# Energy and tone are categories, so they describe a mood without repeating anything its author wrote
+_TONE_PHRASES = {
+    "positive": "in a good place",
+    "negative": "going through a hard time",
+    "neutral": "on an even keel",
+    "mixed": "carrying a mix of feelings",
+    "complex": "holding a lot at once",
+}
+_ENERGY_PHRASES = {"low": "running low on energy", "medium": "moving at a steady pace", "high": "full of energy"}
+_NEEDS = {
+    "low": "rest, comfort and something that asks little of you",
+    "medium": "balance, with some gentle engagement",
+    "high": "an outlet that matches your energy",
+}
+_STRATEGIES = {
+    "low": "Calm, low-effort picks to help you recharge.",
+    "medium": "A balanced mix that keeps you engaged without wearing you out.",
+    "high": "Lively, stimulating picks that give your energy somewhere to go.",
+}
+
+
+def generic_analysis(analysis):
+    """``analysis`` with its prose fields rewritten from energy and tone alone.
+
+    For analyses reused across different moods (near-duplicate cache hits,
+    archetypes): the tags, their reasoning and the categorical fields carry
+    over, never text written about someone else's mood.
+    """
+    energy = analysis.get("energy_level") if analysis.get("energy_level") in ENERGY_LEVELS else "medium"
+    tone = analysis.get("emotional_tone") if analysis.get("emotional_tone") in EMOTIONAL_TONES else "mixed"
+    return {
+        "mood_interpretation": f"It sounds like you're {_TONE_PHRASES[tone]} and {_ENERGY_PHRASES[energy]} right now.",
+        "energy_level": energy,
+        "emotional_tone": tone,
+        "psychological_needs": _NEEDS[energy],
+        "selected_tags": dict(analysis.get("selected_tags") or {}),
+        "tag_reasoning": dict(analysis.get("tag_reasoning") or {}),
+        "overall_strategy": _STRATEGIES[energy],
+    }
+
+
+def default_reasoning(domain, urn):
+    """Stand-in reasoning for ``urn`` when the model's own is missing or was about another tag"""
+    if urn == domain.fallback_tag:
+        return domain.fallback_reasoning
+    return f"{tag_label(urn)} {domain.tag_noun} picks suit where you are right now"
+
+
+def repair_analysis(raw, mood_description, domains):
+    """Validate each field of a parsed analysis and replace only the invalid ones.
+
+    Tag IDs are mapped back to URNs. Returns ``(analysis, repaired)``, where
+    ``repaired`` lists the fields that had to be filled from the defaults.
+    """
+    defaults = fallback_analysis(mood_description, domains)
+    analysis = {}
+    repaired = []
+
+    def text_field(name):
+        value = raw.get(name)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+        repaired.append(name)
+        return defaults[name]
+
+    def choice_field(name, allowed):
+        value = raw.get(name)
+        if isinstance(value, str) and value.strip().lower() in allowed:
+            return value.strip().lower()
+        repaired.append(name)
+        return defaults[name]
+
+    analysis["mood_interpretation"] = text_field("mood_interpretation")
+    analysis["energy_level"] = choice_field("energy_level", ENERGY_LEVELS)
+    analysis["emotional_tone"] = choice_field("emotional_tone", EMOTIONAL_TONES)
+    analysis["psychological_needs"] = text_field("psychological_needs")
+
+    raw_tags = raw.get("selected_tags") if isinstance(raw.get("selected_tags"), dict) else {}
+    raw_reasons = raw.get("tag_reasoning") if isinstance(raw.get("tag_reasoning"), dict) else {}
+    analysis["selected_tags"] = {}
+    analysis["tag_reasoning"] = {}
+    for domain in domains:
+        urn = TAG_INDEX.resolve(domain.tag_category, raw_tags.get(domain.key))
+        if urn is None:
+            repaired.append(f"selected_tags.{domain.key}")
+            urn = domain.fallback_tag
+        analysis["selected_tags"][domain.key] = urn
+
+        reason = raw_reasons.get(domain.key)
+        if not (isinstance(reason, str) and reason.strip()):
+            repaired.append(f"tag_reasoning.{domain.key}")
+            reason = default_reasoning(domain, urn)
+        analysis["tag_reasoning"][domain.key] = reason.strip()
+
+    analysis["overall_strategy"] = text_field("overall_strategy")
+    return analysis, repaired
+
+
+def parse_analysis(text, mood_description, domains):
+    """Parse and repair a completion; never raises, and counts the path taken.
+
+    Returns ``(analysis, clean)`` where ``clean`` is True only if every field
+    came from the model unrepaired, i.e. the result is worth caching.
+    """
+    try:
+        raw, path = extract_json(text.strip())
+    except ValueError:
+        _count("fallback")
+        return fallback_analysis(mood_description, domains), False
+
+    analysis, repaired = repair_analysis(raw, mood_description, domains)
+    _count(path, *(f"repaired:{field}" for field in repaired))
+    if repaired:
+        _count("repaired")
+    return analysis, not repaired
+
+
+def record_fallback():
+    """Count an analysis that fell back to defaults before any text came back (API error)"""
+    _count("fallback")
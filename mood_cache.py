@@ -0,0 +1,167 @@
+"""Two-step cache for mood analyses: exact match on normalized input, then nearest neighbour.
+
+The semantic tier embeds mood text locally (hashed word and character n-grams,
+no network call) into a fixed-size NumPy matrix and does a brute-force cosine
+search, which is well under a millisecond at the capacities we run with.
+
+An exact hit returns the stored analysis as is. A near-duplicate was written
+about someone else's words, so only its tags, their reasoning, energy and tone
+are reused, with the prose fields rebuilt from those (``generic_analysis``).
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from mood_analysis import generic_analysis
+
+EMBEDDING_DIM = 512
+
+_CONTRACTIONS = {
+    "i'm": "i am", "im": "i am", "i've": "i have", "i'd": "i would", "i'll": "i will",
+    "can't": "cannot", "won't": "will not", "don't": "do not", "didn't": "did not",
+    "isn't": "is not", "wasn't": "was not", "it's": "it is", "that's": "that is",
+}
+# Words that carry no mood signal, dropped before embedding so "I'm tired" ~ "feeling tired"
+_FILLER = frozenset("i am me my a an the so really very just right now feeling feel bit kind of little".split())
+# Negations flip meaning while barely moving the embedding; entries must agree on them
+_NEGATIONS = frozenset("not no never cannot nothing without".split())
+
+
+def normalize_mood(text):
+    """Lowercase, expand contractions and collapse punctuation/whitespace"""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    expanded = " ".join(_CONTRACTIONS.get(w, w) for w in words)
+    return expanded.replace("'", "")
+
+
+def embed_mood(text, dim=EMBEDDING_DIM):
+    """Hash word unigrams/bigrams and character trigrams into a unit-length vector"""
+    words = [w for w in normalize_mood(text).split() if w not in _FILLER]
+    # Whole words and bigrams weigh more than the trigrams that smooth over spelling variants
+    features = [(w, 2.0) for w in words]
+    features += [(f"{a} {b}", 2.0) for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        features += [(padded[i:i + 3], 1.0) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        # The sign bit keeps hash collisions from piling up in one direction
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def mood_negations(text):
+    """Negation words in a mood; moods that differ here must never share an analysis"""
+    return frozenset(w for w in normalize_mood(text).split() if w in _NEGATIONS)
+
+
+class MoodAnalysisCache:
+    """Bounded exact + nearest-neighbour cache of mood analyses.
+
+    Both tiers are scoped by (time_context, activity_preferences), since those
+    change which tags the model picks. The semantic tier is a ring buffer of
+    ``capacity`` embeddings, so memory is fixed at ``capacity * dim`` floats;
+    the oldest entry is overwritten once it is full.
+    """
+
+    def __init__(self, capacity=2048, threshold=0.85, dim=EMBEDDING_DIM, embed_fn=embed_mood):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._slots = [None] * capacity  # (context, normalized mood, negations, analysis)
+        self._next_slot = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _context(time_context, activity_preferences):
+        return (time_context or "", tuple(sorted(activity_preferences or ())))
+
+    def match(self, mood, time_context="", activity_preferences=None):
+        """``(value, exact)`` stored for this mood or a near-duplicate of it, or ``(None, False)``"""
+        context = self._context(time_context, activity_preferences)
+        normalized = normalize_mood(mood)
+        with self._lock:
+            value = self._exact.get((context, normalized))
+            if value is not None:
+                self._exact.move_to_end((context, normalized))
+                self.exact_hits += 1
+                return value, True
+
+        match = self.nearest(mood, time_context, activity_preferences, k=1)
+        with self._lock:
+            if match and match[0]["similarity"] >= self.threshold:
+                self.semantic_hits += 1
+                return match[0]["analysis"], False
+            self.misses += 1
+        return None, False
+
+    def get(self, mood, time_context="", activity_preferences=None):
+        """Return a cached analysis for this mood, or None; near-duplicates share only their tags"""
+        analysis, exact = self.match(mood, time_context, activity_preferences)
+        if analysis is None or exact:
+            return analysis
+        return generic_analysis(analysis)
+
+    def put(self, mood, time_context, activity_preferences, analysis):
+        context = self._context(time_context, activity_preferences)
+        normalized = normalize_mood(mood)
+        vector = self.embed_fn(mood)
+        with self._lock:
+            self._exact[(context, normalized)] = analysis
+            self._exact.move_to_end((context, normalized))
+            while len(self._exact) > self.capacity:
+                self._exact.popitem(last=False)
+            slot = self._next_slot
+            self._vectors[slot] = vector
+            self._slots[slot] = (context, normalized, mood_negations(mood), analysis)
+            self._next_slot = (slot + 1) % self.capacity
+
+    def nearest(self, mood, time_context="", activity_preferences=None, k=5):
+        """Most similar cached moods in the same context, best first (for lookups and debugging)"""
+        context = self._context(time_context, activity_preferences)
+        query = self.embed_fn(mood)
+        negations = mood_negations(mood)
+        with self._lock:
+            scores = self._vectors @ query
+            ranked = np.argsort(-scores)
+            results = []
+            for slot in ranked:
+                entry = self._slots[slot]
+                if entry is None or entry[0] != context or entry[2] != negations:
+                    continue
+                results.append({"mood": entry[1], "similarity": float(scores[slot]), "analysis": entry[3]})
+                if len(results) == k:
+                    break
+        return results
+
+    def entries(self):
+        """Cached (context, normalized mood) pairs in the semantic index, oldest first"""
+        with self._lock:
+            order = list(range(self._next_slot, self.capacity)) + list(range(self._next_slot))
+            return [{"context": self._slots[i][0], "mood": self._slots[i][1]} for i in order if self._slots[i]]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "exact_entries": len(self._exact),
+                "indexed_moods": sum(1 for slot in self._slots if slot is not None),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "index_bytes": self._vectors.nbytes,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,38 @@
+"""Live pipeline latency and cache health for operators; enabled with MOODFLOW_ADMIN=1"""
+import os
+
+import pandas as pd
+import streamlit as st
+
+import metrics
+
+st.set_page_config(page_title="MoodFlow Admin", page_icon="📊", layout="wide")
+
+if os.environ.get("MOODFLOW_ADMIN", "0") != "1":
+    st.info("The admin page is disabled. Set MOODFLOW_ADMIN=1 to enable it.")
+    st.stop()
+
+st.title("📊 MoodFlow Admin")
+st.caption("Percentiles cover the most recent requests served by this process. Prometheus can scrape the same numbers from /metrics.")
+st.button("🔄 Refresh")
+
+st.subheader("⏱️ Latency")
+for histogram in metrics.REGISTRY.histograms():
+    rows = histogram.summary()
+    if rows:
+        st.markdown(f"**{histogram.help}**")
+        st.dataframe(pd.DataFrame(rows).drop(columns="metric"), use_container_width=True, hide_index=True)
+
+st.subheader("🔢 Counters")
+for counter in metrics.REGISTRY.counters():
+    rows = [{**dict(key), "value": value} for key, value in sorted(counter.series().items())]
+    if rows:
+        st.markdown(f"**{counter.help}**")
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+st.subheader("🗄️ Caches and parsing")
+gauges = metrics.REGISTRY.gauges()
+if gauges:
+    st.dataframe(pd.DataFrame({"gauge": list(gauges), "value": list(gauges.values())}), use_container_width=True, hide_index=True)
+else:
+    st.write("No engine has started in this process yet.")
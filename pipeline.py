@@ -0,0 +1,216 @@
+"""Pipelined stage runner: each stage starts as soon as its inputs exist, with per-stage timings.
+
+Stages are added while the pipeline is running (a Qloo fetch is submitted the
+moment its tag is parsed out of the streamed analysis), so the dependency graph
+is recorded as stages are added rather than declared up front. ``report`` and
+``critical_path`` turn the recorded graph into something we can reason about:
+which chain of stages actually determined the wall time.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import metrics
+from fanout import DEFAULT_TIMEOUT, FetchOutcome, get_executor
+
+
+@dataclass
+class StageTiming:
+    """When a stage was queued, started and finished, in seconds since the pipeline began"""
+    name: str
+    after: Tuple[str, ...] = ()
+    submitted: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def queued(self):
+        return None if self.started is None else self.started - self.submitted
+
+
+class StageStream:
+    """Items produced by a background stage, buffered until the consumer iterates"""
+
+    _DONE = object()
+
+    def __init__(self, timeout):
+        self._queue = queue.Queue()
+        self._timeout = timeout
+        self.closed = False  # The stage has finished and every item has been handed out
+
+    def put(self, item):
+        self._queue.put(item)
+
+    def close(self):
+        self._queue.put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._timeout)
+            except queue.Empty:
+                return
+            if item is self._DONE:
+                self.closed = True
+                return
+            yield item
+
+    def drain(self):
+        """The items that have arrived so far, without waiting; for consumers that poll"""
+        items = []
+        while not self.closed:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._DONE:
+                self.closed = True
+            else:
+                items.append(item)
+        return items
+
+
+class StageRunner:
+    """Run named stages inline or on a shared worker pool and time each one.
+
+    Background stages must not touch Streamlit; only ``run`` executes on the
+    calling (script) thread. Outcomes are handed out once, either by ``ready``
+    (non-blocking, for polling between streamed chunks) or ``completed``.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.timings = {}
+        self._t0 = time.monotonic()
+        self._futures = {}
+        self._reported = set()
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return time.monotonic() - self._t0
+
+    def _timed(self, name, fn, args, kwargs):
+        timing = self.timings[name]
+        timing.started = self._now()
+        try:
+            with metrics.span(name, stage=name):
+                return fn(*args, **kwargs)
+        except Exception as e:
+            timing.error = repr(e)
+            raise
+        finally:
+            timing.finished = self._now()
+
+    def run(self, name, fn, *args, after=(), **kwargs):
+        """Run a stage on the calling thread and return its result"""
+        self.timings[name] = StageTiming(name, tuple(after), submitted=self._now())
+        return self._timed(name, fn, args, kwargs)
+
+    def submit(self, name, fn, *args, after=(), pool="fanout", **kwargs):
+        """Start a stage on the shared ``pool`` (see fanout.py); submitting the same name twice is a no-op"""
+        with self._lock:
+            if name in self._futures:
+                return self._futures[name]
+            self.timings[name] = StageTiming(name, tuple(after), submitted=self._now())
+            # Run in a copy of the caller's context so spans keep the request's trace ID
+            context = contextvars.copy_context()
+            future = self._futures[name] = get_executor(pool).submit(context.run, self._timed, name, fn, args, kwargs)
+        return future
+
+    def submit_stream(self, name, fn, *args, after=(), pool="fanout", **kwargs):
+        """Start a generator stage in the background and return a StageStream of its items"""
+        stream = StageStream(self.timeout)
+
+        def produce():
+            try:
+                for item in fn(*args, **kwargs):
+                    stream.put(item)
+            finally:
+                stream.close()
+
+        self.submit(name, produce, after=after, pool=pool)
+        return stream
+
+    def submitted(self, name):
+        return name in self._futures
+
+    def _outcome(self, name, future):
+        self._reported.add(name)
+        timing = self.timings[name]
+        elapsed = (timing.finished or self._now()) - timing.submitted
+        try:
+            return FetchOutcome(name, value=future.result(), elapsed=elapsed)
+        except Exception as e:
+            return FetchOutcome(name, error=e, elapsed=elapsed)
+
+    def ready(self, names):
+        """Outcomes for the named stages that have finished and weren't handed out yet"""
+        return [
+            self._outcome(name, self._futures[name])
+            for name in names
+            if name not in self._reported and self._futures[name].done()
+        ]
+
+    def completed(self, names):
+        """Yield outcomes for the named stages in completion order.
+
+        A stage still unfinished ``timeout`` seconds after it was submitted is
+        reported with a ``TimeoutError`` and its result is abandoned.
+        """
+        pending = {self._futures[name]: name for name in names if name not in self._reported}
+        while pending:
+            deadline = min(self.timings[name].submitted for name in pending.values()) + self.timeout
+            done, _ = wait(pending, timeout=max(0.0, deadline - self._now()), return_when=FIRST_COMPLETED)
+            for future in done:
+                yield self._outcome(pending.pop(future), future)
+
+            now = self._now()
+            for future, name in list(pending.items()):
+                timing = self.timings[name]
+                if now - timing.submitted >= self.timeout:
+                    future.cancel()
+                    del pending[future]
+                    self._reported.add(name)
+                    timing.error = "timeout"
+                    yield FetchOutcome(name, error=TimeoutError(f"{name} timed out after {self.timeout:.0f}s"), elapsed=now - timing.submitted)
+
+    def report(self):
+        """Per-stage timings as plain dicts, in the order stages were submitted"""
+        return [
+            {
+                "stage": t.name,
+                "after": list(t.after),
+                "submitted": round(t.submitted, 3),
+                "queued": None if t.queued is None else round(t.queued, 3),
+                "duration": None if t.duration is None else round(t.duration, 3),
+                "finished": None if t.finished is None else round(t.finished, 3),
+                "error": t.error,
+            }
+            for t in sorted(self.timings.values(), key=lambda t: t.submitted)
+        ]
+
+    def critical_path(self):
+        """Stage names on the chain that ended last, following the latest-finishing dependency back"""
+        finished = {name: t for name, t in self.timings.items() if t.finished is not None}
+        if not finished:
+            return []
+        current = max(finished.values(), key=lambda t: t.finished)
+        path = [current.name]
+        while True:
+            deps = [finished[name] for name in current.after if name in finished]
+            if not deps:
+                break
+            current = max(deps, key=lambda t: t.finished)
+            path.append(current.name)
+        return path[::-1]
@@ -0,0 +1,127 @@
+"""Shared Qloo insights client: one pooled keep-alive session per process."""
+import os
+import sys
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+import scheduler
+from tag_index import TAG_INDEX
+
+QLOO_BASE_URL = "https://hackathon.api.qloo.com/v2/insights"
+
+# (connect, read) seconds; a hung upstream must not block a script thread forever
+DEFAULT_TIMEOUT = (
+    float(os.environ.get("MOODFLOW_QLOO_CONNECT_TIMEOUT", "3.05")),
+    float(os.environ.get("MOODFLOW_QLOO_READ_TIMEOUT", "10")),
+)
+# Keep-alive connections held open to the Qloo host; sized to the fan-out pool
+DEFAULT_POOL_SIZE = int(os.environ.get("MOODFLOW_QLOO_POOL_SIZE", "16"))
+DEFAULT_MAX_RETRIES = int(os.environ.get("MOODFLOW_QLOO_MAX_RETRIES", "3"))
+# Sleeps between retries are backoff_factor * 2 ** (attempt - 1): 0.25s, 0.5s, 1s...
+DEFAULT_BACKOFF_FACTOR = float(os.environ.get("MOODFLOW_QLOO_BACKOFF", "0.25"))
+# 429s are left to the process-wide scheduler, which slows every caller down rather than just this one
+RETRY_STATUSES = (500, 502, 503, 504)
+# Entities asked for per query: enough to rank locally and page through without another call
+DEFAULT_TAKE = int(os.environ.get("MOODFLOW_QLOO_TAKE", "20"))
+
+
+def project_entity(entity):
+    """The fields the app uses from one insights entity, in a compact flat dict.
+
+    ``tags`` keeps only tags from our vocabulary, for the local re-ranker.
+    """
+    props = entity.get("properties") or {}
+    image = props.get("image") or {}
+    return {
+        "entity_id": entity.get("entity_id"),
+        "name": entity.get("name") or "Unknown",
+        "description": props.get("description") or "",
+        "image_url": (image.get("url") or "") if isinstance(image, dict) else "",
+        "popularity": entity.get("popularity") or 0.0,
+        "tags": [sys.intern(tag["id"]) for tag in entity.get("tags") or () if isinstance(tag, dict) and tag.get("id") in TAG_INDEX],
+    }
+
+
+class QlooAPIError(Exception):
+    """Qloo answered with a non-2xx status"""
+
+    def __init__(self, entity_type, status_code, retry_after=None):
+        super().__init__(f"Qloo API error for {entity_type}: {status_code}")
+        self.entity_type = entity_type
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class QlooClient:
+    """Thread-safe Qloo insights client.
+
+    Holds a single ``requests.Session`` whose connection pool is reused by every
+    caller, so the TCP+TLS handshake to the Qloo host is paid once per pooled
+    connection instead of once per request. Idempotent GETs are retried with
+    exponential backoff on 5xx, honouring ``Retry-After``. Every request is
+    queued through the process-wide ``scheduler`` for the "qloo" upstream,
+    which handles rate limits and 429s.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        base_url=QLOO_BASE_URL,
+        timeout=DEFAULT_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        upstream_scheduler=None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.scheduler = upstream_scheduler or scheduler.for_upstream("qloo", retry_statuses=(429,))
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"x-api-key": api_key, "Connection": "keep-alive"})
+
+    def insights(self, entity_type, tag, take=DEFAULT_TAKE):
+        """Up to ``take`` entities for one (entity type, tag) query, projected by ``project_entity``"""
+        return self.scheduler.call(self._insights, entity_type, tag, take, key=(entity_type, tag, take))
+
+    def prioritize(self, entity_type, tag, take=DEFAULT_TAKE):
+        """Move a queued request for this query, e.g. from warm-up, up to the caller's lane"""
+        self.scheduler.promote((entity_type, tag, take))
+
+    def _insights(self, entity_type, tag, take):
+        with metrics.upstream_call("qloo", "insights") as call:
+            response = self.session.get(
+                self.base_url,
+                params={
+                    "filter.type": f"urn:entity:{entity_type}",
+                    "filter.tags": tag,
+                    "take": take
+                },
+                timeout=self.timeout,
+            )
+            call.labels["status"] = response.status_code
+        if not response.ok:
+            raise QlooAPIError(entity_type, response.status_code, response.headers.get("Retry-After"))
+        data = response.json()
+        return [project_entity(entity) for entity in data.get("results", {}).get("entities", [])]
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,41 @@
+"""Local re-ranking of Qloo candidates against a mood analysis.
+
+Each Qloo query returns a page of candidates (``MOODFLOW_QLOO_TAKE``), of
+which only a few are shown. Ranking the rest locally means "more like this"
+and reshuffles are answered from the page already held, with no upstream call.
+"""
+import random
+
+# Tag overlap with the analysis outweighs raw popularity; jitter only breaks near-ties
+TAG_WEIGHT = 1.0
+POPULARITY_WEIGHT = 0.5
+JITTER = 0.05
+
+
+def analysis_tags(analysis):
+    """The tag URNs the analysis selected, across every domain"""
+    return frozenset(tag for tag in (analysis or {}).get("selected_tags", {}).values() if isinstance(tag, str))
+
+
+def score(entity, tags):
+    overlap = len(tags.intersection(entity.get("tags") or ()))
+    return TAG_WEIGHT * overlap + POPULARITY_WEIGHT * float(entity.get("popularity") or 0.0)
+
+
+def rank_entities(entities, tags=frozenset(), seed=None):
+    """Candidates best first; a ``seed`` reshuffles entities that score about the same"""
+    tags = frozenset(tags)
+    rng = random.Random(seed) if seed is not None else None
+    jitter = (lambda: rng.uniform(0.0, JITTER)) if rng else (lambda: 0.0)
+    scored = [(score(entity, tags) + jitter(), i, entity) for i, entity in enumerate(entities)]
+    # Ties keep Qloo's own order
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [entity for _, _, entity in scored]
+
+
+def page(entities, tags, start, size, seed=None):
+    """``size`` ranked candidates from position ``start``, wrapping around the pool"""
+    ranked = rank_entities(entities, tags, seed)
+    if not ranked:
+        return []
+    return [ranked[(start + i) % len(ranked)] for i in range(min(size, len(ranked)))]
@@ -0,0 +1,173 @@
+"""Process-wide TTL + LRU cache with single-flight loading and an optional SQLite tier."""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_MISSING = object()
+
+
+class SQLiteTier:
+    """Disk-backed second tier so warm entries survive a process restart.
+
+    Values are stored as JSON, so only JSON-serializable results can be cached.
+    """
+
+    def __init__(self, path, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @staticmethod
+    def _encode_key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (self._encode_key(key),)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return _MISSING, 0.0
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (self._encode_key(key), json.dumps(value), expires_at),
+            )
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    """Bounded in-memory cache keyed by hashable tuples.
+
+    Entries expire ``ttl`` seconds after they are stored and the least recently
+    used entry is evicted once ``max_entries`` is reached. Concurrent misses for
+    the same key are coalesced: one caller runs the loader and the others wait
+    for its result, so a cold key costs exactly one upstream call. Loader
+    exceptions are propagated to every waiter and never cached.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600.0, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at in wall-clock seconds)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.disk = SQLiteTier(disk_path, ttl) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` at most once per miss"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return pending.result()
+
+        try:
+            value, expires_at = self.disk.get(key) if self.disk is not None else (_MISSING, 0.0)
+            if value is not _MISSING:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, expires_at)
+            else:
+                with self._lock:
+                    self.misses += 1
+                value = loader()
+                self.set(key, value)
+            pending.set_result(value)
+            return value
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def expires_in(self, key):
+        """Seconds until ``key`` expires in memory, or None if it isn't cached"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1] - time.time()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,271 @@
+"""Shared store for run results, so sessions hold references instead of copies.
+
+Values are serialized compactly (msgpack when installed, else JSON, then zlib)
+and kept in one of three backends, chosen by ``MOODFLOW_RESULT_STORE``:
+
+    memory (default)            this process only
+    sqlite:///path/results.db   every worker process on the host
+    redis://host:6379/0         every replica (needs the ``redis`` package)
+
+Entries are addressed by content hash. A value stored by ``put`` gets the
+hash of its bytes as its reference, so identical Qloo pages shown to many
+users are stored once. Lookups that should be shared across replicas, such as
+the analysis of a given mood, use a hash of the inputs from ``key_for``.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from response_cache import ResponseCache
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; JSON is the fallback encoding
+    msgpack = None
+
+DEFAULT_TTL = 86400.0
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+
+
+def _pack(value):
+    if msgpack is not None:
+        return b"m", msgpack.packb(value, use_bin_type=True)
+    return b"j", json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def encode(value):
+    """Compact bytes for ``value``; the first byte names the encoding"""
+    prefix, raw = _pack(value)
+    return prefix + zlib.compress(raw)
+
+
+def decode(data):
+    raw = zlib.decompress(data[1:])
+    if data[:1] == b"m":
+        if msgpack is None:
+            raise ValueError("entry was written with msgpack, which isn't installed here")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+
+def key_for(kind, *parts):
+    """Input-addressed key, e.g. ``key_for("analysis", mood, time_context, preferences)``"""
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return f"{kind}:{digest.hexdigest()[:32]}"
+
+
+class MemoryBackend:
+    """In-process LRU bounded by the total size of the stored bytes"""
+
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (bytes, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._bytes -= len(self._entries.pop(key)[0])
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, data, ttl):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (data, time.time() + ttl)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._bytes -= len(self._entries.popitem(last=False)[1][0])
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteBackend:
+    """One SQLite file shared by every worker process on the host"""
+
+    name = "sqlite"
+    shared = True
+    # Expired rows are swept every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_store ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM result_store WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def set(self, key, data, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_store (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, now + ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM result_store WHERE expires_at <= ?", (now,))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM result_store").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+class RedisBackend:
+    """Any Redis-compatible server, shared by every replica; Redis handles expiry"""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("MOODFLOW_RESULT_STORE points at Redis but the redis package isn't installed")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, data, ttl):
+        self._client.set(key, data, ex=max(1, int(ttl)))
+
+    def stats(self):
+        return {}
+
+
+def open_backend(url):
+    if not url or url == "memory":
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported result store: {url!r}")
+
+
+class ResultStore:
+    """Serialized values in a backend, with decoded copies of recent ones kept in memory.
+
+    References handed out by ``put`` never change meaning, so decoding each
+    one once per process is enough however often reruns read it.
+    """
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL, decoded_entries=256):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self._decoded = ResponseCache(max_entries=decoded_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    @classmethod
+    def from_url(cls, url, ttl=DEFAULT_TTL):
+        return cls(open_backend(url), ttl)
+
+    @property
+    def shared(self):
+        """Whether other processes see what this one stores"""
+        return self.backend.shared
+
+    def put(self, kind, value, key=None, ttl=None):
+        """Store ``value`` and return its reference: ``key``, or ``kind:<hash of its bytes>``"""
+        prefix, raw = _pack(value)
+        data = prefix + zlib.compress(raw)
+        if key is None:
+            key = f"{kind}:{hashlib.sha256(data).hexdigest()[:32]}"
+        self.backend.set(key, data, ttl or self.ttl)
+        with self._lock:
+            self.writes += 1
+            self.raw_bytes += len(raw)
+            self.stored_bytes += len(data)
+        return key
+
+    def _load(self, key):
+        data = self.backend.get(key)
+        if data is None:
+            raise KeyError(key)
+        return decode(data)
+
+    def _read(self, read, key, default):
+        try:
+            value = read(key)
+        except (KeyError, ValueError, zlib.error):
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def get(self, ref, default=None):
+        """The value behind a reference from ``put``"""
+        if ref is None:
+            return default
+        return self._read(lambda key: self._decoded.get_or_load(key, lambda: self._load(key)), ref, default)
+
+    def lookup(self, key, default=None):
+        """The current value under a ``key_for`` key, which later puts may replace"""
+        return self._read(self._load, key, default)
+
+    def save_result(self, result):
+        """References to every piece of a RecommendationResult worth keeping per session"""
+        return {
+            "analysis": self.put("analysis", result.analysis),
+            "recommendations": {entity_type: self.put("entities", items) for entity_type, items in result.recommendations.items()},
+            "candidates": {entity_type: self.put("entities", items) for entity_type, items in result.candidates.items()},
+            "summary": self.put("summary", result.summary),
+        }
+
+    def load_result(self, refs):
+        """The values behind ``save_result``'s references, or None once any of them has expired"""
+        missing = object()
+        analysis = self.get(refs["analysis"], missing)
+        summary = self.get(refs["summary"], missing)
+        recommendations = {entity_type: self.get(key, missing) for entity_type, key in refs["recommendations"].items()}
+        candidates = {entity_type: self.get(key, missing) for entity_type, key in refs["candidates"].items()}
+        values = [analysis, summary, *recommendations.values(), *candidates.values()]
+        if any(value is missing for value in values):
+            return None
+        return {"analysis": analysis, "summary": summary, "recommendations": recommendations, "candidates": candidates}
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "compression_ratio": self.stored_bytes / self.raw_bytes if self.raw_bytes else 0.0,
+            }
+        stats.update(self.backend.stats())
+        return stats
@@ -0,0 +1,285 @@
+"""Process-wide scheduling of upstream calls: rate limits, coalescing and priority lanes.
+
+Every OpenAI and Qloo request in the process goes through one scheduler per
+upstream. A token bucket holds calls to the configured quota, and callers
+queue for a slot in lane order, so interactive requests go ahead of batch
+jobs and cache warm-up. A 429, or a 503 with ``Retry-After``, pauses the
+whole upstream for as long as it asks and halves the rate; the rate climbs
+back as calls succeed. Identical calls in flight at the same time share one
+request.
+
+Configured per upstream from the environment, e.g. for Qloo:
+
+    MOODFLOW_QLOO_RATE=10        requests per second (0, the default, is unlimited)
+    MOODFLOW_QLOO_BURST=20       calls allowed back to back after a quiet spell
+    MOODFLOW_QLOO_MAX_WAIT=20    seconds an interactive call may queue before failing
+
+Background work marks its lane with ``with lane(WARMUP):``; the lane follows
+the context into pipeline stages.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BATCH, WARMUP = 0, 1, 2
+LANE_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", WARMUP: "warmup"}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# After a throttle the rate is halved, but never below this share of the quota,
+# and each success wins back this share of it
+MIN_RATE_SHARE = 0.1
+RECOVERY_STEP = 0.05
+
+QUEUE_SECONDS = metrics.REGISTRY.histogram(
+    "moodflow_upstream_queue_seconds", "Time upstream calls waited for a rate-limit slot, by upstream and lane"
+)
+
+_lane = contextvars.ContextVar("moodflow_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def lane(priority):
+    """Run the block's upstream calls in ``priority``'s lane"""
+    token = _lane.set(priority)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class UpstreamBusy(Exception):
+    """An interactive call couldn't get a slot within the scheduler's ``max_wait``"""
+
+    def __init__(self, upstream, waited):
+        super().__init__(f"{upstream} is at its rate limit; gave up after queueing {waited:.1f}s")
+        self.upstream = upstream
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(error):
+    """Seconds the upstream asked us to wait before retrying, or None if it didn't say"""
+    value = getattr(error, "retry_after", None)
+    if value is not None:
+        return _parse_retry_after(value)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        seconds = _parse_retry_after(headers["retry-after-ms"])
+        return None if seconds is None else seconds / 1000
+    return _parse_retry_after(headers.get("retry-after"))
+
+
+class UpstreamScheduler:
+    """Token bucket, priority queue and single-flight for one upstream.
+
+    ``call(fn, *args, key=...)`` runs ``fn`` once a slot is free and returns
+    its result. Failures with one of ``retry_statuses``, or that
+    ``retryable(error)`` accepts, are retried up to ``max_retries`` times,
+    keeping their place in the queue. ``clock`` is the monotonic time source
+    the bucket and pauses are measured against.
+    """
+
+    def __init__(self, name, rate=0.0, burst=None, max_wait=20.0, max_retries=3, backoff=0.5,
+                 retry_statuses=RETRY_STATUSES, retryable=None, clock=time.monotonic):
+        self.name = name
+        self.rate = rate
+        self.limit = rate  # The adaptive rate actually enforced; at most ``rate``
+        self.burst = burst or max(1.0, rate)
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retry_statuses = retry_statuses
+        self.retryable = retryable
+        self._clock = clock
+        self._tokens = self.burst
+        self._refilled = self._clock()
+        self._paused_until = 0.0
+        self._waiting = []  # heap of [lane, seq] tickets
+        self._seq = itertools.count()
+        self._inflight = {}  # key -> (Future, leader's ticket)
+        self._cond = threading.Condition()
+        self.calls = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        if self.limit > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.limit)
+        self._refilled = now
+
+    def _delay(self, now):
+        """Seconds until the head of the queue may go"""
+        delay = self._paused_until - now
+        if self.limit > 0 and self._tokens < 1:
+            delay = max(delay, (1 - self._tokens) / self.limit)
+        return max(delay, 0.0)
+
+    def _acquire(self, ticket, started):
+        deadline = started + self.max_wait if self.max_wait and ticket[0] == INTERACTIVE else None
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    wait = self._delay(now) if self._waiting[0] is ticket else None
+                    if wait == 0:
+                        heapq.heappop(self._waiting)
+                        if self.limit > 0:
+                            self._tokens -= 1
+                        self._cond.notify_all()
+                        return
+                    if deadline is not None:
+                        # Fail now rather than after a pause that is already known to outlast the deadline
+                        if now >= deadline or (wait is not None and now + wait > deadline):
+                            self.rejected += 1
+                            raise UpstreamBusy(self.name, now - started)
+                        wait = deadline - now if wait is None else wait
+                    self._cond.wait(wait)
+            except BaseException:
+                if any(queued is ticket for queued in self._waiting):
+                    self._waiting = [queued for queued in self._waiting if queued is not ticket]
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _throttled(self, delay):
+        with self._cond:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, self._clock() + delay)
+            if self.rate > 0:
+                self.limit = max(self.rate * MIN_RATE_SHARE, self.limit / 2)
+                self._tokens = min(self._tokens, 0.0)
+            self._cond.notify_all()
+        logger.info("%s throttled us; pausing %.2fs, rate now %.2f/s", self.name, delay, self.limit)
+
+    def _succeeded(self):
+        with self._cond:
+            self.calls += 1
+            if self.limit < self.rate:
+                self.limit = min(self.rate, self.limit + self.rate * RECOVERY_STEP)
+
+    def _run(self, fn, args, kwargs, ticket):
+        started = self._clock()
+        attempt = 0
+        while True:
+            self._acquire(ticket, started)
+            if attempt == 0:
+                QUEUE_SECONDS.observe(self._clock() - started, upstream=self.name, lane=LANE_NAMES[ticket[0]])
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                retryable = status in self.retry_statuses or (self.retryable is not None and self.retryable(e))
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = retry_after(e)
+                if status == 429 or (status == 503 and delay is not None):
+                    self._throttled(self.backoff * 2 ** attempt if delay is None else delay)
+                else:
+                    time.sleep(self.backoff * 2 ** attempt if delay is None else delay)
+                with self._cond:
+                    self.retries += 1
+                attempt += 1
+                continue
+            self._succeeded()
+            return result
+
+    def _promote(self, ticket, priority):
+        """Move a queued ticket up to ``priority``'s lane; the caller holds the lock"""
+        if priority < ticket[0]:
+            ticket[0] = priority
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def promote(self, key):
+        """Bring an in-flight call for ``key`` up to the current lane, if it is queued behind it"""
+        with self._cond:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                self._promote(entry[1], _lane.get())
+
+    def call(self, fn, *args, key=None, **kwargs):
+        """``fn(*args, **kwargs)`` in the current lane; calls sharing a ``key`` while in flight share one result"""
+        ticket = [_lane.get(), next(self._seq)]
+        if key is None:
+            return self._run(fn, args, kwargs, ticket)
+        with self._cond:
+            entry = self._inflight.get(key)
+            if entry is not None:
+                self.coalesced += 1
+                # Don't leave an interactive caller waiting on a warm-up call's place in the queue
+                self._promote(entry[1], ticket[0])
+            else:
+                entry = self._inflight[key] = (Future(), ticket)
+        pending, leader_ticket = entry
+        if leader_ticket is not ticket:
+            return pending.result()
+        try:
+            result = self._run(fn, args, kwargs, ticket)
+            pending.set_result(result)
+            return result
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+
+    def stats(self):
+        with self._cond:
+            now = self._clock()
+            return {
+                "rate": self.rate,
+                "limit": self.limit,
+                "queued": len(self._waiting),
+                "paused_seconds": max(0.0, self._paused_until - now),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "rejected": self.rejected,
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def for_upstream(name, **overrides):
+    """The process-wide scheduler for ``name``, configured from MOODFLOW_<NAME>_* on first use"""
+    with _schedulers_lock:
+        if name not in _schedulers:
+            env = os.environ.get
+            prefix = f"MOODFLOW_{name.upper()}_"
+            settings = {
+                "rate": float(env(prefix + "RATE", "0")),
+                "burst": float(env(prefix + "BURST", "0")) or None,
+                "max_wait": float(env(prefix + "MAX_WAIT", "20")),
+                **overrides,
+            }
+            _schedulers[name] = UpstreamScheduler(name, **settings)
+            metrics.REGISTRY.register_collector(f"scheduler_{name}", _schedulers[name].stats)
+        return _schedulers[name]
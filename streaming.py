@@ -0,0 +1,131 @@
+"""Incremental JSON parsing for streamed LLM completions."""
+import json
+
+
+class IncrementalJSONParser:
+    """Consume a JSON object in arbitrary chunks and report each scalar the moment it completes.
+
+    ``feed`` returns ``(path, value)`` pairs, where ``path`` is the tuple of keys
+    and array indices leading to the value, e.g. ``("selected_tags", "movie")``.
+    Text before the first ``{`` (a markdown fence, a stray sentence) and after
+    the root object closes is ignored. A malformed bare value (``high``
+    instead of ``"high"``) is skipped and its path noted in ``malformed``;
+    every field reported before a structural error stays in ``fields``.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._stack = []  # one [kind, key_or_index, expecting_key] frame per open container
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._scalar = []
+        self._started = False
+        self.complete = False
+        self.fields = []  # every (path, value) reported so far
+        self.malformed = []  # paths of bare values that weren't valid JSON
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def _emit(self, value, events):
+        frame = self._stack[-1]
+        if frame[0] == "object" and frame[2]:
+            frame[1] = value
+            return
+        events.append((self._path(), value))
+        # Kept as it completes, so an error later in the same chunk can't lose it
+        self.fields.append(events[-1])
+
+    def _flush_scalar(self, events):
+        if self._scalar:
+            text = "".join(self._scalar).strip()
+            self._scalar = []
+            if text:
+                try:
+                    value = json.loads(text)
+                except ValueError:
+                    self.malformed.append(self._path())
+                    return
+                self._emit(value, events)
+
+    def feed(self, chunk):
+        events = []
+        for char in chunk:
+            if self.complete:
+                break
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+            self._chunks.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._string.append(char)
+                elif char == "\\":
+                    self._escape = True
+                    self._string.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    self._emit(json.loads('"' + "".join(self._string) + '"'), events)
+                    self._string = []
+                else:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append(["object", None, True] if char == "{" else ["array", 0, False])
+            elif char in "}]":
+                self._flush_scalar(events)
+                self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+            elif char == ",":
+                self._flush_scalar(events)
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    frame[2] = True
+                else:
+                    frame[1] += 1
+            elif char == ":":
+                self._stack[-1][2] = False
+            elif not char.isspace():
+                self._scalar.append(char)
+        return events
+
+    @property
+    def text(self):
+        """The JSON text consumed so far, starting at the root ``{``"""
+        return "".join(self._chunks)
+
+    def result(self):
+        """Parse the full document once the root object has closed"""
+        return json.loads(self.text)
+
+    def partial_result(self):
+        """Rebuild the object from the scalars that did complete, e.g. for a truncated completion.
+
+        Containers that were opened but never received a complete value are
+        left out, as is any string cut off mid-way.
+        """
+        root = {}
+        for path, value in self.fields:
+            node = root
+            for key, next_key in zip(path, path[1:]):
+                if isinstance(node, list):
+                    while len(node) <= key:
+                        node.append(None)
+                    if node[key] is None:
+                        node[key] = [] if isinstance(next_key, int) else {}
+                    node = node[key]
+                else:
+                    node = node.setdefault(key, [] if isinstance(next_key, int) else {})
+            if isinstance(node, list):
+                while len(node) <= path[-1]:
+                    node.append(None)
+            node[path[-1]] = value
+        return root
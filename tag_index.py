@@ -0,0 +1,126 @@
+"""Immutable index over the fixed Qloo tag vocabulary, built once at import time.
+
+Every (category, tag) pair gets a small integer ID. IDs within a category are
+contiguous, so each category owns a ``range`` and checking that an ID belongs
+to it is O(1). The model picks tags by ID, which keeps the prompt short and
+lets the JSON schema restrict each answer to the IDs of the right category.
+"""
+import sys
+from types import MappingProxyType
+
+_VOCABULARY = {
+    "movie_genres": [
+        "urn:tag:genre:media:action", "urn:tag:genre:media:adventure", "urn:tag:genre:media:animation",
+        "urn:tag:genre:media:biography", "urn:tag:genre:media:comedy", "urn:tag:genre:media:crime",
+        "urn:tag:genre:media:documentary", "urn:tag:genre:media:drama", "urn:tag:genre:media:family",
+        "urn:tag:genre:media:fantasy", "urn:tag:genre:media:film-noir", "urn:tag:genre:media:history",
+        "urn:tag:genre:media:horror", "urn:tag:genre:media:music", "urn:tag:genre:media:musical",
+        "urn:tag:genre:media:mystery", "urn:tag:genre:media:romance", "urn:tag:genre:media:sci-fi",
+        "urn:tag:genre:media:sport", "urn:tag:genre:media:thriller", "urn:tag:genre:media:war",
+        "urn:tag:genre:media:western", "urn:tag:genre:media:indie", "urn:tag:genre:media:cult"
+    ],
+    "music_genres": [
+        "urn:tag:genre:music:pop", "urn:tag:genre:music:rock", "urn:tag:genre:music:hip-hop",
+        "urn:tag:genre:music:jazz", "urn:tag:genre:music:classical", "urn:tag:genre:music:electronic",
+        "urn:tag:genre:music:country", "urn:tag:genre:music:r&b", "urn:tag:genre:music:folk",
+        "urn:tag:genre:music:reggae", "urn:tag:genre:music:blues", "urn:tag:genre:music:indie",
+        "urn:tag:genre:music:ambient", "urn:tag:genre:music:punk", "urn:tag:genre:music:metal",
+        "urn:tag:genre:music:alternative", "urn:tag:genre:music:funk", "urn:tag:genre:music:soul",
+        "urn:tag:genre:music:world", "urn:tag:genre:music:acoustic", "urn:tag:genre:music:experimental"
+    ],
+    "book_categories": [
+        "urn:tag:genre:media:fiction", "urn:tag:genre:media:non-fiction", "urn:tag:genre:media:biography",
+        "urn:tag:genre:media:memoir", "urn:tag:genre:media:history", "urn:tag:genre:media:philosophy",
+        "urn:tag:genre:media:science", "urn:tag:genre:media:self-help", "urn:tag:genre:media:psychology",
+        "urn:tag:genre:media:poetry", "urn:tag:genre:media:mystery", "urn:tag:genre:media:romance",
+        "urn:tag:genre:media:fantasy", "urn:tag:genre:media:sci-fi", "urn:tag:genre:media:thriller",
+        "urn:tag:genre:media:adventure", "urn:tag:genre:media:business", "urn:tag:genre:media:health",
+        "urn:tag:genre:media:spirituality", "urn:tag:genre:media:travel", "urn:tag:genre:media:cooking"
+    ],
+    "podcast_types": [
+        "urn:tag:genre:media:comedy", "urn:tag:genre:media:education", "urn:tag:genre:media:news",
+        "urn:tag:genre:media:storytelling", "urn:tag:genre:media:true-crime", "urn:tag:genre:media:business",
+        "urn:tag:genre:media:health", "urn:tag:genre:media:technology", "urn:tag:genre:media:science",
+        "urn:tag:genre:media:history", "urn:tag:genre:media:philosophy", "urn:tag:genre:media:motivation",
+        "urn:tag:genre:media:mindfulness", "urn:tag:genre:media:interview", "urn:tag:genre:media:culture",
+        "urn:tag:genre:media:politics", "urn:tag:genre:media:sports", "urn:tag:genre:media:arts"
+    ],
+    "destination_vibes": [
+        "urn:tag:region:global:adventure", "urn:tag:region:global:relaxing", "urn:tag:region:global:cultural",
+        "urn:tag:region:global:scenic", "urn:tag:region:global:urban", "urn:tag:region:global:quiet",
+        "urn:tag:region:global:vibrant", "urn:tag:region:global:historic", "urn:tag:region:global:nature",
+        "urn:tag:region:global:beach", "urn:tag:region:global:mountain", "urn:tag:region:global:tropical",
+        "urn:tag:region:global:romantic", "urn:tag:region:global:family", "urn:tag:region:global:luxury",
+        "urn:tag:region:global:budget", "urn:tag:region:global:exotic", "urn:tag:region:global:spiritual"
+    ]
+}
+
+
+def tag_label(urn):
+    """Human-readable name for a tag URN, e.g. 'Sci Fi' for urn:tag:genre:media:sci-fi"""
+    return urn.split(':')[-1].replace('-', ' ').title()
+
+
+class TagIndex:
+    """Read-only ID <-> URN index with one contiguous ID range per category"""
+
+    def __init__(self, vocabulary):
+        tags = []
+        ranges = {}
+        ids = {}
+        for category, urns in vocabulary.items():
+            start = len(tags)
+            for urn in urns:
+                urn = sys.intern(urn)
+                ids[(category, urn)] = len(tags)
+                tags.append(urn)
+            ranges[category] = range(start, len(tags))
+
+        self.tags = tuple(tags)
+        self.categories = MappingProxyType(ranges)
+        self.vocabulary = MappingProxyType({category: self.tags[r.start:r.stop] for category, r in ranges.items()})
+        self._ids = MappingProxyType(ids)
+        self._urns = frozenset(tags)
+        self._category_of = tuple(category for category, r in ranges.items() for _ in r)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __contains__(self, urn):
+        return urn in self._urns
+
+    def urn(self, tag_id):
+        return self.tags[tag_id]
+
+    def category_of(self, tag_id):
+        return self._category_of[tag_id]
+
+    def id_of(self, category, urn):
+        """ID of ``urn`` within ``category``, or None if the category doesn't offer it"""
+        return self._ids.get((category, urn))
+
+    def is_valid(self, category, tag_id):
+        return isinstance(tag_id, int) and tag_id in self.categories[category]
+
+    def resolve(self, category, value):
+        """Turn a model answer (ID, numeric string or exact URN) into a URN of ``category``, or None"""
+        if isinstance(value, str):
+            value = value.strip()
+            if value.isdigit():
+                value = int(value)
+            else:
+                return value if self.id_of(category, value) is not None else None
+        if isinstance(value, bool) or not isinstance(value, int):
+            return None
+        return self.tags[value] if value in self.categories[category] else None
+
+    def ids(self, category):
+        return list(self.categories[category])
+
+    def prompt_listing(self, category):
+        """Compact 'id=label' listing of a category for the prompt"""
+        return ", ".join(f"{tag_id}={self.tags[tag_id].split(':')[-1]}" for tag_id in self.categories[category])
+
+
+TAG_INDEX = TagIndex(_VOCABULARY)
+del _VOCABULARY
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+import api
+
+
+def call(method, path, body=b"", chunk_size=None):
+    """(status, decoded JSON) for one request through the ASGI app"""
+    chunk_size = chunk_size or max(1, len(body))
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": []}
+    asyncio.run(api.app(scope, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    calls = []
+
+    async def recommend(*args):
+        calls.append(args)
+        return types.SimpleNamespace(to_dict=lambda: {"summary": "ok"})
+
+    fake = types.SimpleNamespace(recommend=recommend, warmer=None, calls=calls)
+    monkeypatch.setattr(api, "_engine", fake)
+    return fake
+
+
+def test_parse_request_normalizes_a_valid_body():
+    body = json.dumps({"mood": "  tired ", "preferences": ["Movies"], "time_context": None}).encode()
+    assert api._parse_request(body) == ("tired", "", ["Movies"], "")
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"not json", "body must be JSON"),
+    (b"[1, 2]", "body must be a JSON object"),
+    (b"", "'mood' must be a non-empty string"),
+    (b'{"mood": "   "}', "'mood' must be a non-empty string"),
+    (b'{"mood": "tired", "preferences": "Movies"}', "'preferences' must be a list"),
+    (b'{"mood": "tired", "preferences": ["Games"]}', "'preferences' must be a list"),
+    (b'{"mood": "tired", "time_context": 7}', "must be strings"),
+])
+def test_parse_request_rejects_bad_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        api._parse_request(body)
+
+
+def test_recommend_runs_the_engine(engine):
+    status, payload = call("POST", "/recommend", b'{"mood": "tired", "preferences": ["Books"]}', chunk_size=5)
+    assert (status, payload) == (200, {"summary": "ok"})
+    assert engine.calls == [("tired", "", ["Books"], "")]
+
+
+def test_invalid_body_is_a_400(engine):
+    status, payload = call("POST", "/recommend", b'{"mood": ""}')
+    assert status == 400 and "mood" in payload["error"]
+    assert engine.calls == []
+
+
+def test_oversized_body_is_a_413(engine):
+    body = json.dumps({"mood": "x" * api.MAX_BODY_BYTES}).encode()
+    status, payload = call("POST", "/recommend", body, chunk_size=4096)
+    assert status == 413 and str(api.MAX_BODY_BYTES) in payload["error"]
+    assert engine.calls == []
+
+
+def test_wrong_method_is_a_405_and_unknown_path_a_404(engine):
+    assert call("GET", "/recommend")[0] == 405
+    assert call("POST", "/healthz")[0] == 405
+    assert call("GET", "/nowhere")[0] == 404
+
+
+def test_readyz_follows_the_warmer(engine):
+    assert call("GET", "/readyz") == (200, {"ready": True})
+    engine.warmer = types.SimpleNamespace(progress=lambda: {"ready": False, "warmed": 3})
+    assert call("GET", "/readyz") == (503, {"ready": False, "warmed": 3})
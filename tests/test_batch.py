@@ -0,0 +1,87 @@
+import json
+import types
+
+import pytest
+
+from batch import BatchItem, BatchRunner, _end_torn_line, completed_ids, group_items, read_items
+
+LONG_MOOD = "I'm exhausted and anxious because my manager keeps yelling at me in every meeting and I can't sleep"
+
+
+def ids(groups):
+    return [[item.id for item in group] for group in groups]
+
+
+def test_read_items_from_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "moods.jsonl"
+    jsonl.write_text('{"id": "a", "mood": "tired", "preferences": ["Movies"]}\n\n{"mood": " calm "}\n')
+    items = read_items(str(jsonl))
+    assert [(item.id, item.mood, item.preferences) for item in items] == [("a", "tired", ["Movies"]), ("3", "calm", [])]
+
+    csv_file = tmp_path / "moods.csv"
+    csv_file.write_text("mood,preferences,time_context\nrestless,Movies; Music,Evening\n")
+    assert read_items(str(csv_file)) == [BatchItem("2", "restless", "Evening", ["Movies", "Music"])]
+
+
+def test_read_items_rejects_unknown_preferences(tmp_path):
+    path = tmp_path / "moods.jsonl"
+    path.write_text('{"mood": "tired", "preferences": ["Games"]}\n')
+    with pytest.raises(ValueError, match="line 1"):
+        read_items(str(path))
+
+
+def test_identical_and_near_identical_moods_share_a_group():
+    items = [
+        BatchItem("1", LONG_MOOD),
+        BatchItem("2", LONG_MOOD.upper()),
+        BatchItem("3", LONG_MOOD.replace("I can't sleep", "I cannot sleep at all")),
+        BatchItem("4", "happy and ready for the weekend"),
+    ]
+    assert ids(group_items(items)) == [["1", "2", "3"], ["4"]]
+
+
+def test_context_and_negation_keep_moods_apart():
+    items = [
+        BatchItem("1", "I feel tired today"),
+        BatchItem("2", "I feel tired today", time_context="Morning"),
+        BatchItem("3", "I feel tired today", preferences=["Books"]),
+        BatchItem("4", "I do not feel tired today"),
+    ]
+    assert ids(group_items(items)) == [["1"], ["2"], ["3"], ["4"]]
+
+
+def test_resume_skips_written_ids_and_ignores_a_torn_last_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "1", "summary": "x"}\n{"id": "2", "summary": "y"}\n{"id": "3", "summ')
+    assert completed_ids(str(path)) == {"1", "2"}
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+    _end_torn_line(str(path))
+    with open(path, "a") as f:
+        f.write(json.dumps({"id": "3"}) + "\n")
+    assert completed_ids(str(path)) == {"1", "2", "3"}
+
+
+def test_end_torn_line_leaves_complete_files_alone(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "1"}\n')
+    _end_torn_line(str(path))
+    assert path.read_text() == '{"id": "1"}\n'
+
+
+def test_failed_lookups_are_retried_and_successes_fetched_once():
+    calls = []
+
+    def fetch(entity_type, tag):
+        calls.append((entity_type, tag))
+        if len(calls) == 1:
+            raise RuntimeError("429")
+        return [{"name": "Dune"}]
+
+    runner = BatchRunner(types.SimpleNamespace(get_qloo_recommendations=fetch))
+    entities, error = runner.lookup("book", "urn:tag:genre:media:fiction")
+    assert entities == [] and "429" in error
+
+    assert runner.lookup("book", "urn:tag:genre:media:fiction") == ([{"name": "Dune"}], None)
+    assert runner.lookup("book", "urn:tag:genre:media:fiction") == ([{"name": "Dune"}], None)
+    assert len(calls) == 2
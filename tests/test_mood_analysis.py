@@ -0,0 +1,82 @@
+import json
+from collections import Counter
+
+from domains import DOMAINS_BY_KEY
+from mood_analysis import extract_json, parse_analysis, parse_stats, repair_analysis
+
+DOMAINS = [DOMAINS_BY_KEY["movie"], DOMAINS_BY_KEY["music"]]
+RAW = {
+    "mood_interpretation": "You sound worn out.",
+    "energy_level": "low",
+    "emotional_tone": "negative",
+    "psychological_needs": "Rest",
+    "selected_tags": {"movie": 1, "music": 25},
+    "tag_reasoning": {"movie": "Escape", "music": "Release"},
+    "overall_strategy": "Gentle picks.",
+}
+
+
+def counted(text):
+    """parse_analysis's result and the counters it added"""
+    before = Counter(parse_stats())
+    result = parse_analysis(text, "worn out", DOMAINS)
+    return result, dict(Counter(parse_stats()) - before)
+
+
+def test_clean_json_is_kept_and_counted_as_strict():
+    (analysis, clean), paths = counted(json.dumps(RAW))
+    assert clean
+    assert analysis["selected_tags"] == {"movie": "urn:tag:genre:media:adventure", "music": "urn:tag:genre:music:rock"}
+    assert analysis["mood_interpretation"] == "You sound worn out."
+    assert paths == {"strict": 1}
+
+
+def test_fenced_json_is_extracted():
+    text = "Here is the analysis:\n```json\n" + json.dumps(RAW) + "\n```\nHope it helps!"
+    assert extract_json(text) == (RAW, "extracted")
+    (analysis, clean), paths = counted(text)
+    assert clean
+    assert paths == {"extracted": 1}
+
+
+def test_truncated_completion_keeps_finished_fields_and_repairs_the_rest():
+    text = json.dumps(RAW)
+    text = text[:text.index('"tag_reasoning"') + 30]  # Cut off inside the reasoning
+    (analysis, clean), paths = counted(text)
+
+    assert not clean
+    assert analysis["mood_interpretation"] == "You sound worn out."
+    assert analysis["selected_tags"]["music"] == "urn:tag:genre:music:rock"
+    assert analysis["overall_strategy"] == "Providing balanced content for emotional equilibrium and gentle engagement."
+    assert paths["partial"] == 1
+    assert paths["repaired"] == 1
+    assert paths["repaired:overall_strategy"] == 1
+    assert "strict" not in paths and "fallback" not in paths
+
+
+def test_invalid_tag_id_is_repaired_alone():
+    raw = {**RAW, "selected_tags": {"movie": 9999, "music": 0}}  # 0 is a movie genre, not a music one
+    analysis, repaired = repair_analysis(raw, "worn out", DOMAINS)
+
+    assert repaired == ["selected_tags.movie", "selected_tags.music"]
+    assert analysis["selected_tags"] == {"movie": DOMAINS[0].fallback_tag, "music": DOMAINS[1].fallback_tag}
+    # The model's own reasoning and prose survive
+    assert analysis["tag_reasoning"] == {"movie": "Escape", "music": "Release"}
+    assert analysis["psychological_needs"] == "Rest"
+
+
+def test_bad_choice_and_missing_reasoning_are_repaired_per_field():
+    raw = {**RAW, "energy_level": "HIGH ", "emotional_tone": "furious", "tag_reasoning": {"movie": " "}}
+    analysis, repaired = repair_analysis(raw, "worn out", DOMAINS)
+
+    assert analysis["energy_level"] == "high"
+    assert analysis["emotional_tone"] == "mixed"
+    assert analysis["tag_reasoning"]["music"].startswith("Rock")
+    assert repaired == ["emotional_tone", "tag_reasoning.movie", "tag_reasoning.music"]
+
+
+def test_text_without_json_falls_back():
+    (analysis, clean), paths = counted("Sorry, I can't help with that.")
+    assert not clean
+    assert analysis["selected_tags"] == {"movie": DOMAINS[0].fallback_tag, "music": DOMAINS[1].fallback_tag}
+    assert paths == {"fallback": 1}
@@ -0,0 +1,39 @@
+from mood_cache import MoodAnalysisCache
+
+MOOD = "I'm exhausted and anxious because my manager Mark keeps yelling at me in every meeting and I can't sleep"
+ANALYSIS = {
+    "mood_interpretation": "Mark's yelling is wearing you down.",
+    "energy_level": "low",
+    "emotional_tone": "negative",
+    "psychological_needs": "Distance from Mark and some rest",
+    "selected_tags": {"movie": "urn:tag:genre:media:comedy"},
+    "tag_reasoning": {"movie": "Comedy gives you a break from the stress"},
+    "overall_strategy": "Light, restful picks after dealing with Mark all day.",
+}
+
+
+def test_exact_hit_returns_the_stored_analysis():
+    cache = MoodAnalysisCache()
+    cache.put(MOOD, "Evening", ["Movies"], ANALYSIS)
+    assert cache.get(MOOD.upper(), "Evening", ["Movies"]) == ANALYSIS
+    assert cache.get(MOOD, "Morning", ["Movies"]) is None
+
+
+def test_near_duplicate_reuses_tags_but_none_of_the_prose():
+    cache = MoodAnalysisCache()
+    cache.put(MOOD, "", None, ANALYSIS)
+    analysis = cache.get(MOOD.replace("Mark", "Lisa"))
+
+    assert analysis is not None
+    assert cache.stats()["semantic_hits"] == 1
+    assert analysis["selected_tags"] == ANALYSIS["selected_tags"]
+    assert analysis["tag_reasoning"] == ANALYSIS["tag_reasoning"]
+    assert (analysis["energy_level"], analysis["emotional_tone"]) == ("low", "negative")
+    for field in ("mood_interpretation", "psychological_needs", "overall_strategy"):
+        assert analysis[field] and "Mark" not in analysis[field]
+
+
+def test_negated_mood_never_matches():
+    cache = MoodAnalysisCache()
+    cache.put("I feel tired today", "", None, ANALYSIS)
+    assert cache.get("I do not feel tired today") is None
@@ -0,0 +1,98 @@
+import threading
+import time
+import types
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = types.SimpleNamespace(now=1000.0)
+    fake.time = lambda: fake.now
+    monkeypatch.setattr(response_cache, "time", fake)
+    return fake
+
+
+def test_loader_runs_once_per_miss():
+    cache = ResponseCache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        return ["entity"]
+
+    assert cache.get_or_load(("movie", "calm"), load) == ["entity"]
+    assert cache.get_or_load(("movie", "calm"), load) == ["entity"]
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl=60)
+    cache.set("key", "value")
+    clock.now += 59
+    assert cache.get("key") == "value"
+    assert cache.expires_in("key") == pytest.approx(1)
+    clock.now += 1
+    assert cache.get("key", "gone") == "gone"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "page"
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("key", load))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(1)
+
+    assert results == ["page"] * 4
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 3
+
+
+def test_loader_errors_reach_the_caller_and_are_not_cached():
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("key", fail)
+    assert cache.get_or_load("key", lambda: "recovered") == "recovered"
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(disk_path=path).get_or_load(("book", "cozy"), lambda: {"name": "Dune"})
+
+    cache = ResponseCache(disk_path=path)
+    assert cache.get_or_load(("book", "cozy"), lambda: pytest.fail("should come from disk")) == {"name": "Dune"}
+    assert cache.stats()["disk_hits"] == 1
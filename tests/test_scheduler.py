@@ -0,0 +1,182 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, WARMUP, UpstreamBusy, UpstreamScheduler, lane
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def advance(scheduler, clock, seconds):
+    """Move time on and wake every queued caller so it re-checks the bucket"""
+    with scheduler._cond:
+        clock.now += seconds
+        scheduler._cond.notify_all()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the scheduler")
+        time.sleep(0.005)
+
+
+def in_thread(fn, priority=INTERACTIVE):
+    outcome = {}
+
+    def run():
+        with lane(priority):
+            try:
+                outcome["result"] = fn()
+            except Exception as e:
+                outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+class Throttled(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("slow down")
+        self.retry_after = retry_after
+
+
+def test_interactive_calls_go_ahead_of_queued_background_work():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler("test", rate=1.0, burst=1, clock=clock)
+    scheduler.call(lambda: None)  # Empties the bucket
+    order = []
+
+    warmup, _ = in_thread(lambda: scheduler.call(order.append, "warmup"), WARMUP)
+    wait_until(lambda: scheduler.stats()["queued"] == 1)
+    batch, _ = in_thread(lambda: scheduler.call(order.append, "batch"), BATCH)
+    interactive, _ = in_thread(lambda: scheduler.call(order.append, "interactive"))
+    wait_until(lambda: scheduler.stats()["queued"] == 3)
+
+    for expected in (1, 2, 3):
+        advance(scheduler, clock, 1.0)
+        wait_until(lambda: len(order) == expected)
+    for thread in (warmup, batch, interactive):
+        thread.join(1)
+    assert order == ["interactive", "batch", "warmup"]
+
+
+def test_identical_calls_in_flight_share_one_request():
+    scheduler = UpstreamScheduler("test", clock=FakeClock())
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "page"
+
+    leader, led = in_thread(lambda: scheduler.call(fetch, key="movie:calm"))
+    wait_until(lambda: calls)
+    follower, followed = in_thread(lambda: scheduler.call(fetch, key="movie:calm"))
+    wait_until(lambda: scheduler.coalesced == 1)
+    release.set()
+    leader.join(1)
+    follower.join(1)
+
+    assert led["result"] == followed["result"] == "page"
+    assert len(calls) == 1
+    assert scheduler.stats()["calls"] == 1
+
+
+def test_coalesced_interactive_call_promotes_a_queued_warmup_leader():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler("test", rate=1.0, burst=1, clock=clock)
+    scheduler.call(lambda: None)
+    order = []
+
+    leader, _ = in_thread(lambda: scheduler.call(order.append, "shared", key="shared"), WARMUP)
+    wait_until(lambda: scheduler.stats()["queued"] == 1)
+    batch, _ = in_thread(lambda: scheduler.call(order.append, "batch"), BATCH)
+    wait_until(lambda: scheduler.stats()["queued"] == 2)
+    follower, _ = in_thread(lambda: scheduler.call(order.append, "shared", key="shared"))
+    wait_until(lambda: scheduler.coalesced == 1)
+
+    advance(scheduler, clock, 1.0)
+    wait_until(lambda: order)
+    assert order == ["shared"]
+    advance(scheduler, clock, 1.0)
+    for thread in (leader, batch, follower):
+        thread.join(1)
+    assert order == ["shared", "batch"]
+
+
+def test_interactive_call_fails_fast_when_the_wait_would_outlast_max_wait():
+    scheduler = UpstreamScheduler("test", rate=0.1, burst=1, max_wait=5.0, clock=FakeClock())
+    scheduler.call(lambda: None)
+
+    with pytest.raises(UpstreamBusy) as busy:
+        scheduler.call(lambda: "never")  # The next token is 10s away
+    assert busy.value.upstream == "test"
+    assert scheduler.stats()["rejected"] == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_background_calls_wait_past_max_wait():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler("test", rate=0.1, burst=1, max_wait=5.0, clock=clock)
+    scheduler.call(lambda: None)
+
+    thread, outcome = in_thread(lambda: scheduler.call(lambda: "done"), WARMUP)
+    wait_until(lambda: scheduler.stats()["queued"] == 1)
+    advance(scheduler, clock, 10.0)
+    thread.join(1)
+    assert outcome == {"result": "done"}
+
+
+def test_retry_after_pauses_the_upstream_and_halves_the_rate():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler("test", rate=10.0, burst=1, clock=clock)
+    attempts = []
+
+    def fetch():
+        attempts.append(clock())
+        if len(attempts) == 1:
+            raise Throttled(retry_after="2")
+        return "ok"
+
+    thread, outcome = in_thread(lambda: scheduler.call(fetch))
+    wait_until(lambda: scheduler.throttled == 1 and scheduler.stats()["queued"] == 1)
+    stats = scheduler.stats()
+    assert stats["paused_seconds"] == pytest.approx(2.0)
+    assert stats["limit"] == pytest.approx(5.0)
+
+    advance(scheduler, clock, 1.0)
+    time.sleep(0.05)
+    assert len(attempts) == 1  # Still paused
+
+    advance(scheduler, clock, 1.0)
+    thread.join(1)
+    assert outcome == {"result": "ok"}
+    assert attempts[1] - attempts[0] == pytest.approx(2.0)
+    assert scheduler.stats()["retries"] == 1
+    assert scheduler.stats()["limit"] == pytest.approx(5.5)  # Each success wins some rate back
+
+
+def test_retry_after_pause_longer_than_max_wait_rejects_interactive_callers():
+    clock = FakeClock()
+    scheduler = UpstreamScheduler("test", rate=10.0, burst=1, max_wait=5.0, clock=clock)
+
+    def fetch():
+        raise Throttled(retry_after="30")
+
+    with pytest.raises(UpstreamBusy):
+        scheduler.call(fetch)
+    assert scheduler.throttled == 1
+    assert scheduler.stats()["paused_seconds"] == pytest.approx(30.0)
@@ -0,0 +1,70 @@
+import json
+
+from streaming import IncrementalJSONParser
+
+ANALYSIS = {
+    "mood_interpretation": "Tired but hopeful",
+    "energy_level": "low",
+    "selected_tags": {"movie": "comfort", "book": "cozy"},
+    "notes": ["rest", "walk"],
+    "confidence": 0.8,
+}
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+def test_reports_each_scalar_with_its_path_however_the_text_is_split():
+    text = json.dumps(ANALYSIS)
+    for size in (1, 3, 7, len(text)):
+        parser = IncrementalJSONParser()
+        events = feed_in_chunks(parser, text, size)
+        assert events == [
+            (("mood_interpretation",), "Tired but hopeful"),
+            (("energy_level",), "low"),
+            (("selected_tags", "movie"), "comfort"),
+            (("selected_tags", "book"), "cozy"),
+            (("notes", 0), "rest"),
+            (("notes", 1), "walk"),
+            (("confidence",), 0.8),
+        ]
+        assert parser.complete
+        assert parser.result() == ANALYSIS
+
+
+def test_field_is_reported_as_soon_as_its_value_closes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"mood_interpretation": "Tired') == []
+    assert parser.feed(' but hopeful", "energy') == [(("mood_interpretation",), "Tired but hopeful")]
+
+
+def test_ignores_text_around_the_root_object():
+    parser = IncrementalJSONParser()
+    parser.feed('Here you go:\n```json\n{"energy_level": "high"}\n```')
+    assert parser.complete
+    assert parser.text == '{"energy_level": "high"}'
+    assert parser.result() == {"energy_level": "high"}
+
+
+def test_escaped_quotes_stay_inside_the_string():
+    parser = IncrementalJSONParser()
+    events = parser.feed(r'{"quote": "she said \"rest\""}')
+    assert events == [(("quote",), 'she said "rest"')]
+
+
+def test_malformed_bare_value_is_skipped_and_the_rest_kept():
+    parser = IncrementalJSONParser()
+    parser.feed('{"mood_interpretation": "Calm", "energy_level": high, "selected_tags": {"movie": "drama"}}')
+    assert parser.malformed == [("energy_level",)]
+    assert parser.partial_result() == {"mood_interpretation": "Calm", "selected_tags": {"movie": "drama"}}
+
+
+def test_partial_result_keeps_completed_fields_of_a_truncated_completion():
+    parser = IncrementalJSONParser()
+    parser.feed('{"mood_interpretation": "Calm", "notes": ["rest", "wal')
+    assert not parser.complete
+    assert parser.partial_result() == {"mood_interpretation": "Calm", "notes": ["rest"]}
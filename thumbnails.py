@@ -0,0 +1,262 @@
+"""Image proxy with a bounded on-disk thumbnail cache for the recommendation cards.
+
+Cards point at ``/img?u=<source url>&s=<signature>`` instead of full-size art
+on third-party hosts. Each source is fetched once, shrunk to card size (when
+Pillow is installed; otherwise stored as is) and written under the SHA-256 of
+the thumbnail bytes, so the same image behind different URLs is stored once.
+Responses are immutable and cached by browsers for a year.
+
+The proxy is served by api.py, and for the Streamlit app by a background
+server on MOODFLOW_IMAGE_PROXY_PORT. Set MOODFLOW_IMAGE_PROXY_URL to the
+address browsers reach it at to switch cards over; without it cards keep
+their original image URLs. Only URLs signed with MOODFLOW_IMAGE_PROXY_SECRET
+are fetched, so the proxy can't be used to reach arbitrary hosts.
+"""
+import hashlib
+import hmac
+import io
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+import requests
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it images are cached at full size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+PROXY_URL = os.environ.get("MOODFLOW_IMAGE_PROXY_URL", "").rstrip("/")
+CACHE_DIR = os.environ.get("MOODFLOW_IMAGE_CACHE_DIR", os.path.join(".cache", "thumbnails"))
+MAX_CACHE_BYTES = int(os.environ.get("MOODFLOW_IMAGE_CACHE_MB", "256")) * 1024 * 1024
+# Cards show images at up to 180 CSS px; twice that stays sharp on HiDPI screens
+THUMBNAIL_WIDTH = 360
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = (3.05, 10)
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Workers behind one load balancer must share this, or their signatures won't verify
+_SECRET = (os.environ.get("MOODFLOW_IMAGE_PROXY_SECRET") or secrets.token_hex(16)).encode()
+
+
+class ImageProxyError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def sign(url):
+    return hmac.new(_SECRET, url.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+def proxied_url(url):
+    """Where a card should load ``url`` from: the proxy when configured, else the source itself"""
+    if not url or not PROXY_URL or not url.startswith(("http://", "https://")):
+        return url
+    return f"{PROXY_URL}/img?{urlencode({'u': url, 's': sign(url)})}"
+
+
+def _shrink(data):
+    """(bytes, content type) of a card-sized version of ``data``"""
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 3))
+        out = io.BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(out, "PNG", optimize=True)
+            return out.getvalue(), "image/png"
+        image.convert("RGB").save(out, "JPEG", quality=80, optimize=True, progressive=True)
+        return out.getvalue(), "image/jpeg"
+
+
+class ThumbnailCache:
+    """Content-addressed thumbnails on disk, evicted least recently used beyond ``max_bytes``.
+
+    ``by-url/<sha256 of url>`` names the thumbnail for a source URL and
+    ``blobs/<sha256 of thumbnail>.<ext>`` holds it. Concurrent requests for an
+    uncached URL share one fetch.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "by-url"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        self.session = requests.Session()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Running size of blobs/, so only writes that push it over max_bytes pay for a directory scan
+        self._bytes = self._scan_total()
+
+    def _url_path(self, url):
+        return os.path.join(self.directory, "by-url", hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+    def _blob_path(self, name):
+        return os.path.join(self.directory, "blobs", name)
+
+    def _cached(self, url):
+        try:
+            with open(self._url_path(url)) as f:
+                name = f.read().strip()
+            with open(self._blob_path(name), "rb") as f:
+                data = f.read()
+            os.utime(self._blob_path(name))  # Recency for eviction
+        except OSError:
+            # Also a blob evicted between the read and the utime: refetch rather than fail
+            return None
+        return data, "image/png" if name.endswith(".png") else "image/jpeg", name.split(".")[0]
+
+    def _fetch(self, url):
+        # Closing the streamed response hands its connection back to the pool on every path
+        with self.session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            if not response.ok:
+                raise ImageProxyError(502, f"upstream answered {response.status_code}")
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                raise ImageProxyError(502, "upstream did not return an image")
+            data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ImageProxyError(502, "image too large")
+        if Image is None:
+            return data, content_type.split(";")[0]
+        try:
+            return _shrink(data)
+        except Exception as e:
+            raise ImageProxyError(502, f"unreadable image: {e}")
+
+    def _store(self, url, data, content_type):
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest}.{'png' if content_type == 'image/png' else 'jpg'}"
+        blob = self._blob_path(name)
+        if not os.path.exists(blob):
+            tmp = f"{blob}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, blob)
+            with self._lock:
+                self._bytes += len(data)
+                over = self._bytes > self.max_bytes
+            if over:
+                self._evict()
+        with open(self._url_path(url), "w") as f:
+            f.write(name)
+        return digest
+
+    def _blobs(self):
+        """(mtime, size, path) of every stored thumbnail"""
+        blobs = []
+        for entry in os.scandir(os.path.join(self.directory, "blobs")):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # Evicted by another thread mid-scan
+            blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        return blobs
+
+    def _scan_total(self):
+        return sum(size for _, size, _ in self._blobs())
+
+    def _evict(self):
+        blobs = self._blobs()
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)  # Its by-url pointers now dangle and read as misses
+            except OSError:
+                pass
+            total -= size
+        with self._lock:
+            # Resynchronise with the disk, which other processes may share
+            self._bytes = total
+
+    def get(self, url):
+        """(bytes, content type, etag) for ``url``, fetching and shrinking it on first use"""
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+        with self._lock:
+            pending = self._inflight.get(url)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[url] = Future()
+        if not leader:
+            return pending.result()
+        try:
+            data, content_type = self._fetch(url)
+            result = (data, content_type, self._store(url, data, content_type))
+            pending.set_result(result)
+            return result
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThumbnailCache()
+        return _cache
+
+
+def handle(query_string, if_none_match=None):
+    """Answer one proxy request: (status, content type, extra headers, body)"""
+    query = parse_qs(query_string)
+    url, signature = query.get("u", [""])[0], query.get("s", [""])[0]
+    if not url.startswith(("http://", "https://")) or not hmac.compare_digest(signature, sign(url)):
+        return 403, "text/plain", [], b"bad signature"
+    try:
+        data, content_type, etag = get_cache().get(url)
+    except ImageProxyError as e:
+        logger.info("Image proxy miss for %s: %s", url, e)
+        return e.status, "text/plain", [], str(e).encode()
+    except requests.RequestException as e:
+        logger.info("Image proxy fetch failed for %s: %s", url, e)
+        return 504, "text/plain", [], b"upstream unreachable"
+    headers = [("Cache-Control", CACHE_CONTROL), ("ETag", f'"{etag}"')]
+    if if_none_match and etag in if_none_match:
+        return 304, content_type, headers, b""
+    return 200, content_type, headers, data
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path.rstrip("/") != "/img":
+            self.send_error(404)
+            return
+        status, content_type, headers, body = handle(query, self.headers.get("If-None-Match"))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve /img on a background thread, for processes without their own HTTP server"""
+    server = ThreadingHTTPServer((host, port), _ProxyHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="moodflow-image-proxy", daemon=True).start()
+    return server
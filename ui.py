@@ -0,0 +1,148 @@
+"""Rendering helpers for the Streamlit app, built once per process.
+
+Streamlit reruns app.py on every interaction. The static markup lives here as
+module constants, and card HTML is memoized per entity, so a rerun only
+re-sends strings that already exist instead of rebuilding them.
+"""
+import html
+from functools import lru_cache
+
+import streamlit as st
+
+from domains import DOMAINS_BY_ENTITY_TYPE
+from thumbnails import proxied_url
+
+APP_CSS = """<style>
+    .main-header {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        padding: 2rem;
+        border-radius: 10px;
+        color: white;
+        text-align: center;
+        margin-bottom: 2rem;
+    }
+    
+    .mood-card {
+        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
+        padding: 1.5rem;
+        border-radius: 15px;
+        color: white;
+        margin: 1rem 0;
+    }
+    
+    .recommendation-card {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 10px;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        margin: 1rem 0;
+        border-left: 4px solid #667eea;
+    }
+    
+    .category-header {
+        background: linear-gradient(90deg, #4facfe 0%, #00f2fe 100%);
+        color: white;
+        padding: 0.8rem;
+        border-radius: 8px;
+        font-weight: bold;
+        margin: 1rem 0 0.5rem 0;
+    }
+    
+    .stButton > button {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        border: none;
+        border-radius: 25px;
+        padding: 0.5rem 2rem;
+        font-weight: bold;
+        transition: all 0.3s ease;
+    }
+    
+    .mood-emoji {
+        font-size: 2rem;
+        margin-right: 0.5rem;
+    }
+    
+    .analysis-box {
+        background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%);
+        padding: 1.5rem;
+        border-radius: 15px;
+        color: #333;
+        margin: 1rem 0;
+    }
+    
+    .dynamic-mapping-box {
+        background: linear-gradient(135deg, #ffeaa7 0%, #fab1a0 100%);
+        padding: 1.5rem;
+        border-radius: 15px;
+        color: #333;
+        margin: 1rem 0;
+        border: 2px solid #e17055;
+    }
+</style>
+"""
+
+HEADER_HTML = """<div class="main-header">
+    <h1>🧘 MoodFlow</h1>
+    <h3>Your Personal Lifestyle Companion</h3>
+    <p>Advanced AI-powered dynamic mood analysis for truly personalized content discovery</p>
+</div>
+"""
+
+FOOTER_HTML = """<div style="text-align: center; color: #666; padding: 2rem;">
+    <p>✨ MoodFlow - Where AI meets emotional intelligence ✨</p>
+    <p><small>Powered by advanced mood understanding and dynamic content curation</small></p>
+</div>
+"""
+
+
+@lru_cache(maxsize=64)
+def category_header_html(domain):
+    registered = DOMAINS_BY_ENTITY_TYPE.get(domain)
+    return f"""
+    <div class="category-header">
+        {registered.emoji if registered else "🎯"} {registered.title if registered else domain.title()}
+    </div>
+    """
+
+
+@lru_cache(maxsize=4096)
+def card_html(name, description, image_url):
+    """Recommendation card markup; Qloo text is escaped since it is rendered as HTML.
+
+    Images go through the thumbnail proxy when one is configured and load lazily.
+    """
+    card = f"""
+            <div class="recommendation-card">
+                <h4>{html.escape(name)}</h4>
+                <p style="color: #666; font-size: 0.9rem;">{html.escape(description)}</p>
+            """
+    if image_url:
+        card += f'<img src="{html.escape(proxied_url(image_url))}" loading="lazy" decoding="async" style="width:100%; max-width:180px; border-radius:8px; margin-top:8px;">'
+    return card + "</div>"
+
+
+def summary_html(text):
+    """The "Your Personalized Journey" panel around a summary"""
+    return f"""
+        <div style="background: linear-gradient(135deg, #ffecd2 0%, #fcb69f 100%); 
+                    padding: 1.5rem; border-radius: 15px; color: #333; 
+                    font-size: 1.1rem; line-height: 1.6; font-style: italic;">
+            {html.escape(text)}
+        </div>
+        """
+
+
+def render_domain_recommendations(domain, items):
+    """Category header plus one card per recommended entity"""
+    st.markdown(category_header_html(domain), unsafe_allow_html=True)
+
+    if items:
+        for item in items:
+            st.markdown(card_html(
+                item.get('name') or 'Unknown',
+                item.get('description') or 'No description available',
+                item.get('image_url') or '',
+            ), unsafe_allow_html=True)
+    else:
+        st.info(f"No {domain} recommendations found for the AI-selected tags. The AI chose very specific criteria - try describing your mood with different nuances.")
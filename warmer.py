@@ -0,0 +1,142 @@
+"""Background warm-up of the Qloo response cache.
+
+The tag vocabulary is fixed, so every Qloo query the app can make is one of
+about a hundred (entity type, tag) pairs. The warmer fetches them into the
+engine's cache at startup, most requested first, and re-fetches each one
+shortly before it expires, so users never wait on a cold or expired entry.
+Upstream calls are paced to stay within ``rate`` requests per second, and
+queue in the scheduler's warm-up lane behind user traffic.
+"""
+import logging
+import threading
+import time
+
+from domains import DOMAINS
+from scheduler import WARMUP, lane
+from tag_index import TAG_INDEX
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 5.0
+# Refresh once less than this share of the TTL is left
+DEFAULT_REFRESH_MARGIN = 0.1
+
+
+def all_queries():
+    """Every (entity type, tag) pair the engine can ask Qloo for, in vocabulary order"""
+    return [
+        (domain.entity_type, TAG_INDEX.urn(tag_id))
+        for domain in DOMAINS
+        for tag_id in TAG_INDEX.ids(domain.tag_category)
+    ]
+
+
+class CacheWarmer:
+    """Keeps the engine's Qloo cache populated from a daemon thread.
+
+    ``top_n`` limits warming to the most requested pairs (all of them when 0;
+    before any traffic, popularity falls back to vocabulary order). ``ready``
+    turns true once the first pass has tried every pair, which is what a
+    readiness probe should wait on.
+    """
+
+    def __init__(self, engine, rate=DEFAULT_RATE, top_n=0, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        self.engine = engine
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.top_n = top_n
+        self.margin = engine.qloo_cache.ttl * refresh_margin
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="moodflow-warmer", daemon=True)
+        self._lock = threading.Lock()
+        self.total = 0
+        self.warmed = 0
+        self.failures = 0
+        self.fetches = 0
+        self.passes = 0
+        self.ready = False
+        self.started_at = None
+        self.ready_after = None
+
+    def queries(self):
+        """Pairs to keep warm, most requested first"""
+        popularity = self.engine.qloo_popularity()
+        queries = sorted(all_queries(), key=lambda query: -popularity.get(query, 0))
+        return queries[:self.top_n] if self.top_n else queries
+
+    def start(self):
+        if self.engine.qloo_cache.ttl <= 0:
+            logger.info("Qloo cache TTL is 0; nothing to warm")
+            self.ready = True
+            return self
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _fetch(self, entity_type, tag, refresh):
+        try:
+            if refresh:
+                self.engine.refresh_qloo_recommendations(entity_type, tag)
+            else:
+                self.engine.load_qloo_recommendations(entity_type, tag)
+        except Exception as e:
+            logger.warning("Warming %s %s failed: %s", entity_type, tag, e)
+            with self._lock:
+                self.failures += 1
+            return False
+        with self._lock:
+            self.fetches += 1
+        return True
+
+    def _pass(self):
+        """Fetch every missing or nearly expired pair; returns seconds until the next one is due"""
+        cache = self.engine.qloo_cache
+        queries = self.queries()
+        with self._lock:
+            self.total = len(queries)
+            self.warmed = 0
+        next_due = cache.ttl - self.margin
+        for entity_type, tag in queries:
+            if self._stop.is_set():
+                break
+            expires_in = cache.expires_in((entity_type, tag))
+            if expires_in is None or expires_in <= self.margin:
+                if not self._fetch(entity_type, tag, refresh=expires_in is not None):
+                    # Retry failures within a minute rather than a TTL from now
+                    next_due = min(next_due, 60.0)
+                self._stop.wait(self.interval)
+                expires_in = cache.expires_in((entity_type, tag))
+            if expires_in is not None:
+                with self._lock:
+                    self.warmed += 1
+                next_due = min(next_due, expires_in - self.margin)
+        return next_due
+
+    def _loop(self):
+        with lane(WARMUP):
+            self._run()
+
+    def _run(self):
+        while not self._stop.is_set():
+            next_due = self._pass()
+            with self._lock:
+                self.passes += 1
+                if not self.ready:
+                    self.ready = True
+                    self.ready_after = time.monotonic() - self.started_at
+                    logger.info("Qloo cache warm: %d/%d pairs in %.1fs", self.warmed, self.total, self.ready_after)
+            self._stop.wait(max(1.0, next_due))
+
+    def progress(self):
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "total": self.total,
+                "warmed": self.warmed,
+                "failures": self.failures,
+                "fetches": self.fetches,
+                "passes": self.passes,
+                "ready_after_seconds": self.ready_after,
+            }